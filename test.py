@@ -2,9 +2,24 @@
 # encoding: utf-8
 
 import os
+import re
 import copy
+import random
+import shutil
+import tempfile
+import threading
+import io
+import sys
+import json
+import zipfile
+import time
+import signal
+import socket
+import contextlib
+import subprocess
 import unittest
 import unittest.mock
+import urllib.parse
 
 import tldr
 
@@ -34,6 +49,21 @@ ok_config = {
     "compact_output": False
 }
 
+def load_tool(name):
+    """Load a script in tools/, which has a '-' in its name"""
+
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(ROOT, 'tools', name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# the original re.split() based parse_inline_md(), for equivalence test
+parse_inline_md_reference = load_tool('bench-parse-inline-md').parse_inline_md_reference
+
+
 class TldrPureFunctionTests(unittest.TestCase):
     def test_check_config(self):
         self.assertRaises(AssertionError, tldr.check_config, '')
@@ -79,6 +109,31 @@ class TldrPureFunctionTests(unittest.TestCase):
         config['command_indent_size'] = -1
         self.assertRaises(AssertionError, tldr.check_config, config)
     
+    def test_get_pattern_prefix(self):
+        self.assertEqual(tldr.get_pattern_prefix(), '')
+        self.assertEqual(tldr.get_pattern_prefix(glob='git-*'), 'git-')
+        self.assertEqual(tldr.get_pattern_prefix(glob='*u*'), '')
+        self.assertEqual(tldr.get_pattern_prefix(glob='d[ua]'), 'd')
+        self.assertEqual(tldr.get_pattern_prefix(regex='^git-c'), 'git-c')
+        self.assertEqual(tldr.get_pattern_prefix(regex='^gitx?'), 'git')
+        self.assertEqual(tldr.get_pattern_prefix(regex='^git.*'), 'git')
+        self.assertEqual(tldr.get_pattern_prefix(regex='git'), '')
+        self.assertEqual(tldr.get_pattern_prefix(regex='^git|^du'), '')
+        self.assertEqual(tldr.get_pattern_prefix(glob='g*', regex='^git'), 'git')
+
+    def test_ansi_style(self):
+        try:
+            import click
+        except ImportError:
+            self.skipTest('click not installed')
+
+        for fg in [None] + list(tldr.ANSI_COLORS.keys()):
+            for bold in (None, True, False):
+                for underline in (None, True, False):
+                    for reset in (True, False):
+                        kwargs = {'fg': fg, 'bold': bold, 'underline': underline, 'reset': reset}
+                        self.assertEqual(tldr.ansi_style('text', **kwargs), click.style('text', **kwargs))
+
     def test_parse_args(self):
         tldr.parse_args(['-v'])
         tldr.parse_args(['--version'])
@@ -90,6 +145,24 @@ class TldrPureFunctionTests(unittest.TestCase):
         tldr.parse_args(['--list', '-p', 'linux'])
         tldr.parse_args(['--list', '-p', 'linux', 'tar'])
         tldr.parse_args(['--update'])
+        tldr.parse_args(['--search', 'compress', 'directory'])
+        tldr.parse_args(['--search', '-p', 'linux', 'wireless'])
+        tldr.parse_args(['--batch'])
+        tldr.parse_args(['--compile-pack', 'pages.tldrpack'])
+        tldr.parse_args(['--complete', 'gi'])
+        tldr.parse_args(['--complete=', '-p', 'linux'])
+        tldr.parse_args(['--completion', 'bash'])
+        tldr.parse_args(['--profile', 'tar'])
+        tldr.parse_args(['--prerender', 'prerender'])
+        tldr.parse_args(['--serve'])
+        self.assertEqual(tldr.parse_args(['--json', 'tar']).format, 'json')
+        self.assertEqual(tldr.parse_args(['--format', 'ansi', '-p', 'linux', 'tar']).format, 'ansi')
+        self.assertEqual(tldr.parse_args(['--serve', '8080']).serve, 8080)
+        tldr.parse_args(['-l', '--glob', 'git-*', '--regex', '^git', '--sort', '--unique', '-0'])
+        tldr.parse_args(['--batch', '-p', 'all', 'du', 'tar'])
+
+        args = tldr.parse_args(['--batch', 'du', 'git-pull'])
+        self.assertEqual(args.command_list, ['du', 'git-pull'])
 
         args = tldr.parse_args(['-p', 'linux', 'git', 'pull'])
         self.assertEqual(args.command, 'git-pull')
@@ -109,6 +182,24 @@ class TldrPureFunctionTests(unittest.TestCase):
             ['--init', '--update'],
             ['--list', '--update'],
             ['--init', '--list', '--update'],
+            ['--search'],
+            ['--search', '--list', 'tar'],
+            ['--batch', '--search', 'tar'],
+            ['--daemon', 'tar'],
+            ['--serve', 'tar'],
+            ['--json'],
+            ['--json', '--list', 'tar'],
+            ['--format', 'xml', 'tar'],
+            ['--serve', '8080', 'tar'],
+            ['--compile-pack'],
+            ['--compile-pack', 'pages.tldrpack', 'tar'],
+            ['--complete'],
+            ['--complete', 'gi', 'tar'],
+            ['--completion', 'tcsh'],
+            ['--completion', 'bash', '-p', 'linux'],
+            ['--prerender', 'prerender', 'tar'],
+            ['--sort', 'tar'],
+            ['-s', '--glob', 'git-*', 'tar'],
         ):
             self.assertRaises(SystemExit, tldr.parse_args, args)
 
@@ -156,10 +247,25 @@ class ConfigTests(unittest.TestCase):
 
 class TestsWithConfig(unittest.TestCase):
     def setUp(self):
+        self.config_dir = tempfile.mkdtemp()
+        os.environ['TLDR_CONFIG_DIR'] = self.config_dir
+
+        tldr.open_pack.cache_clear()
+        tldr.open_zip.cache_clear()
+        tldr.get_index_cache.cache_clear()
+        tldr.get_page_hash_cache.cache_clear()
         tldr.get_index.cache_clear()
+        tldr.get_client.cache_clear()
+        tldr.get_search_index.cache_clear()
+        tldr.get_suggest_cache.cache_clear()
         tldr.get_config.cache_clear()
+        tldr.is_color_output.cache_clear()
         tldr.get_escape_str.cache_clear()
+        tldr.get_style_table.cache_clear()
         tldr.get_escape_str_by_type.cache_clear()
+        tldr.get_style_hash.cache_clear()
+        tldr.get_prerender_directory.cache_clear()
+        tldr.get_page_style.cache_clear()
 
         self.tldr_get_config = tldr.get_config
         tldr.get_config = unittest.mock.Mock(return_value=copy.deepcopy(ok_config))
@@ -167,6 +273,9 @@ class TestsWithConfig(unittest.TestCase):
     def tearDown(self):
         tldr.get_config = self.tldr_get_config
 
+        del os.environ['TLDR_CONFIG_DIR']
+        shutil.rmtree(self.config_dir)
+
     def test_get_escape_str(self):
         self.assertEqual(tldr.get_escape_str(fg='red'), '\x1b[31m')
         self.assertEqual(tldr.get_escape_str(fg='reset'), '\x1b[39m')
@@ -190,6 +299,129 @@ class TestsWithConfig(unittest.TestCase):
         result = '\x1b[32m\x1b[24musage \x1b[37m\x1b[24mcommand \x1b[36m\x1b[4mparam\x1b[37m\x1b[24m command\x1b[32m\x1b[24m usage\x1b[0m'
         self.assertEqual(tldr.parse_inline_md(line, 'usage'), result)
     
+    def test_read_page(self):
+        page = tldr.read_page(os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'linux', 'du.md'))
+        self.assertEqual(page.title, 'du')
+        self.assertFalse(hasattr(page, '__dict__'))
+        self.assertEqual([_.get_text() for _ in page.get_description()], ['Estimate file space usage'])
+        usage, command = page.get_examples()[0]
+        self.assertEqual(usage.type, 'usage')
+        self.assertEqual(command.spans, [('command', 'du -sh '), ('param', 'file/directory'), ('command', '')])
+
+        result = page.to_dict()
+        self.assertEqual(len(result['examples']), 4)
+        self.assertEqual(result['examples'][0]['command'], {'text': 'du -sh file/directory', 'spans': [['command', 'du -sh '], ['param', 'file/directory']]})
+        self.assertEqual(json.loads(json.dumps(result)), result)
+
+        html = tldr.render_page_html(page)
+        self.assertIn('<h1>du</h1>', html)
+        self.assertIn('<pre><code>du -sh <var>file/directory</var></code></pre>', html)
+
+        self.assertEqual(tldr.parse_inline_spans('a `b {{c}}`{{', 'usage'), [('usage', 'a '), ('command', 'b '), ('param', 'c'), ('command', ''), ('usage', ''), ('param', '')])
+        self.assertEqual(tldr.parse_inline_spans('a}}', 'usage'), [('usage', 'a'), (None, '')])
+
+    def test_print_pages(self):
+        tldr.get_config.return_value['color_output'] = 'never'
+        page_path_list = tldr.get_page_path_list('tldr-test', 'all')
+        def print_pages(command, page_path_list):
+            with unittest.mock.patch('tldr.write_stdout_bytes') as write_stdout_bytes:
+                tldr.print_pages(command, page_path_list)
+            return b''.join([_[0][0] for _ in write_stdout_bytes.call_args_list])
+
+        # all 3 pages are the same, shown once
+        result_expected = b''.join([f'tldr-test - {_}\n'.encode('utf-8') for _ in page_path_list]) + tldr.render_page(page_path_list[0])
+        self.assertEqual(print_pages('tldr-test', page_path_list), result_expected)
+
+        # a page removed since looked up does not hide the others
+        page_path_list = tldr.get_page_path_list('du', 'all')
+        missing_page_path = os.path.join(self.config_dir, 'linux', 'du.md')
+        with self.assertLogs(level='ERROR'):
+            result = print_pages('du', [page_path_list[0], missing_page_path, page_path_list[1]])
+        self.assertEqual(result, b''.join([
+            f'du - {page_path_list[0]}\n'.encode('utf-8'), tldr.render_page(page_path_list[0]),
+            f'du - {missing_page_path}\n'.encode('utf-8'),
+            f'du - {page_path_list[1]}\n'.encode('utf-8'), tldr.render_page(page_path_list[1]),
+        ]))
+
+        # stdout closed early, e.g. `tldr tar | head -1`
+        with open(os.path.join(self.config_dir, 'tldr.config.json'), 'w') as f:
+            json.dump(ok_config, f)
+        env = dict(os.environ, TLDR_CONFIG_DIR=self.config_dir, TLDR_NO_DAEMON='1')
+        process = subprocess.Popen([sys.executable, tldr.__file__, '-p', 'all', 'tldr-test'], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process.stdout.close()
+        self.assertEqual(process.wait(10), 1)
+        self.assertNotIn(b'Traceback', process.stderr.read())
+        process.stderr.close()
+
+    def test_group_same_pages(self):
+        repo_path_list = [os.path.join(self.config_dir, 'a'), os.path.join(self.config_dir, 'b')]
+        for repo_path in repo_path_list:
+            shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages1'), repo_path)
+        with open(os.path.join(repo_path_list[1], 'linux', 'du.md'), 'r+', encoding='utf-8') as f:
+            data = f.read().replace('# du', '#   DU')
+            f.seek(0)
+            f.write(data)
+        tldr.get_config.return_value['repo_directory_list'] = repo_path_list
+
+        a_linux, a_osx, b_linux, b_osx = tldr.get_page_path_list('du', 'all')
+        result_expected = [([a_linux], None), ([a_osx, b_osx], None), ([b_linux], a_linux)]
+        self.assertEqual(tldr.group_same_pages([a_linux, a_osx, b_linux, b_osx]), result_expected)
+        self.assertEqual(sorted(tldr.load_cache('hashes.json', tldr.PAGE_HASH_CACHE_VERSION)[repo_path_list[0]]), ['linux/du', 'osx/du'])
+
+        # hashes are read from hashes.json, the index is neither loaded nor written
+        tldr.get_index.cache_clear()
+        tldr.get_index_cache.cache_clear()
+        tldr.get_page_hash_cache.cache_clear()
+        with unittest.mock.patch('tldr.read_page_bytes', side_effect=AssertionError), unittest.mock.patch('tldr.get_index_cache', side_effect=AssertionError):
+            self.assertEqual(tldr.group_same_pages([a_linux, a_osx, b_linux, b_osx]), result_expected)
+
+        tldr.get_config.return_value['color_output'] = 'never'
+        tldr.clear_style_caches()
+        output = b''.join(tldr.iter_page_output('du', [a_linux, a_osx, b_linux, b_osx])).decode('utf-8')
+        self.assertIn(f'du - {b_linux} (nearly the same as {a_linux})\n', output)
+        self.assertIn(f'du - {a_osx}\ndu - {b_osx}\n', output)
+
+    def test_print_pages_json(self):
+        page_path_list = tldr.get_page_path_list('du', 'all')
+        with unittest.mock.patch('tldr.write_stdout_bytes') as write_stdout_bytes:
+            tldr.action_find('du', 'all', 'json')
+        result = json.loads(write_stdout_bytes.call_args[0][0])
+        self.assertEqual([_['page_path'] for _ in result], page_path_list)
+        self.assertEqual(result[0]['page']['title'], 'du')
+
+    def test_parse_inline_md_fuzz(self):
+        tldr.get_config.return_value['color_output'] = 'always'
+        rand = random.Random(0)
+        alphabet = ['`', '{{', '}}', '{', '}', '{{{', '}}}', 'a', 'b c', ' ', '\u4e2d']
+        for _ in range(5000):
+            line = ''.join(rand.choice(alphabet) for _ in range(rand.randint(0, 20)))
+            line_type = rand.choice(['description', 'usage', 'command'])
+            try:
+                result_expected = parse_inline_md_reference(line, line_type)
+            except IndexError: # fail safe stack exhausted
+                self.assertRaises(IndexError, tldr.parse_inline_md, line, line_type)
+                continue
+
+            self.assertEqual(tldr.parse_inline_md(line, line_type), result_expected, line)
+
+    def test_get_rendered_page(self):
+        page_path = os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'linux', 'du.md')
+        result = tldr.get_rendered_page(page_path)
+        self.assertEqual(result, ''.join([line + '\n' for line in tldr.parse_page(page_path)]).encode('utf-8'))
+
+        with unittest.mock.patch('tldr.parse_page') as parse_page:
+            self.assertEqual(tldr.get_rendered_page(page_path), result)
+            parse_page.assert_not_called()
+
+        tldr.get_config.return_value['compact_output'] = True
+        tldr.clear_style_caches()
+        self.assertNotEqual(tldr.get_rendered_page(page_path), result)
+
+        render_cache_dir_path = os.path.join(tldr.get_cache_dir_path(), 'render')
+        self.assertEqual(len(os.listdir(render_cache_dir_path)), 2)
+        tldr.evict_render_cache(render_cache_dir_path, 0)
+        self.assertEqual(len(os.listdir(render_cache_dir_path)), 0)
+
     def test_get_index(self):
         result = [
             ('osx', 'airport'),
@@ -208,6 +440,395 @@ class TestsWithConfig(unittest.TestCase):
         repo_path = os.path.join(ROOT, 'tldr-pages-test', 'pages2')
         self.assertEqual(sorted(tldr.get_index(repo_path)), sorted(result))
 
+    def test_get_index_cache(self):
+        repo_path = os.path.join(self.config_dir, 'pages')
+        shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages1'), repo_path)
+        result = sorted(tldr.get_index(repo_path))
+        self.assertTrue(os.path.exists(os.path.join(tldr.get_cache_dir_path(), 'index.json')))
+
+        tldr.get_index_cache.cache_clear()
+        tldr.get_index.cache_clear()
+        with unittest.mock.patch('tldr.build_index') as build_index:
+            self.assertEqual(sorted(tldr.get_index(repo_path)), result)
+            build_index.assert_not_called()
+
+        os.rename(os.path.join(repo_path, 'linux', 'tcpflow.md'), os.path.join(repo_path, 'linux', 'tcpdump.md'))
+        os.utime(os.path.join(repo_path, 'linux'), ns=(0, 0)) # mtime may not change on coarse timestamp filesystems
+        tldr.get_index_cache.cache_clear()
+        tldr.get_index.cache_clear()
+        result = sorted(tldr.get_index(repo_path))
+        self.assertIn(('linux', 'tcpdump'), result)
+        self.assertNotIn(('linux', 'tcpflow'), result)
+
+    def test_get_search_terms(self):
+        self.assertEqual(tldr.get_search_terms('Compresses a directory'), ['compress', 'directori'])
+        self.assertEqual(tldr.get_search_terms('compressed directories'), ['compress', 'directori'])
+        self.assertEqual(tldr.get_search_terms('compressing the Directory'), ['compress', 'directori'])
+
+    def test_search_pages(self):
+        repo_path = os.path.join(self.config_dir, 'pages')
+        shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages1'), repo_path)
+        tldr.get_config.return_value['repo_directory_list'] = [repo_path]
+
+        result = tldr.search_pages('wireless networks')
+        self.assertEqual([_['command'] for _ in result], ['airport'])
+        self.assertEqual(result[0]['page_path'], os.path.join(repo_path, 'osx', 'airport.md'))
+        self.assertEqual(result[0]['description'], 'Wireless network configuration utility.')
+
+        result = tldr.search_pages('file space')
+        self.assertEqual(sorted([_['page_path'] for _ in result]), [os.path.join(repo_path, 'linux', 'du.md'), os.path.join(repo_path, 'osx', 'du.md')])
+        self.assertEqual(len(tldr.search_pages('file space', 'linux')), 1)
+        self.assertEqual(tldr.search_pages('not-exist-word'), [])
+
+        # only the new page is tokenized
+        with open(os.path.join(repo_path, 'linux', 'iwconfig.md'), 'w') as f:
+            f.write('# iwconfig\n\n> Configure a wireless network interface.\n')
+        os.utime(os.path.join(repo_path, 'linux'), ns=(0, 0))
+        tldr.get_index_cache.cache_clear()
+        tldr.get_index.cache_clear()
+        tldr.get_search_index.cache_clear()
+        with unittest.mock.patch('tldr.get_page_search_doc', wraps=tldr.get_page_search_doc) as get_page_search_doc:
+            result = tldr.search_pages('wireless')
+            get_page_search_doc.assert_called_once()
+        self.assertEqual(sorted([_['command'] for _ in result]), ['airport', 'iwconfig'])
+
+        # warm query reads no page
+        tldr.get_search_index.cache_clear()
+        with unittest.mock.patch('tldr.get_page_search_doc') as get_page_search_doc, unittest.mock.patch('tldr.load_cache', wraps=tldr.load_cache) as load_cache:
+            self.assertEqual(len(tldr.search_pages('wireless', limit=1)), 1)
+            get_page_search_doc.assert_not_called()
+        self.assertNotIn('docs', tldr.get_search_index())
+        self.assertEqual(len([_ for _ in load_cache.call_args_list if _.args[0].startswith('search/docs.')]), 1)
+        self.assertEqual(len(tldr.search_pages('wireless')), 2)
+
+        # a removed repo has no stamp, always stale
+        shutil.rmtree(repo_path)
+        tldr.get_index_cache.cache_clear()
+        tldr.get_index.cache_clear()
+        tldr.get_search_index.cache_clear()
+        with self.assertLogs('tldr', 'WARNING'):
+            self.assertEqual(tldr.search_pages('wireless'), [])
+        self.assertEqual(tldr.load_cache('search/meta.json', tldr.SEARCH_INDEX_VERSION)['stamps'], [None])
+        tldr.get_search_index.cache_clear()
+        self.assertEqual(tldr.search_pages('wireless'), [])
+
+    def test_suggest_commands(self):
+        self.assertEqual(tldr.suggest_commands('airprot'), ['airport'])
+        self.assertEqual(tldr.suggest_commands('tcp-flow'), ['tcpflow'])
+        self.assertEqual(tldr.suggest_commands('tcp flow'), ['tcpflow'])
+        self.assertEqual(tldr.suggest_commands('TLDR_Test'), ['tldr-test'])
+        self.assertEqual(tldr.suggest_commands('tldr-test-foo'), ['tldr-test'])
+        self.assertEqual(tldr.suggest_commands('tldr'), ['tldr-test'])
+        self.assertEqual(tldr.suggest_commands('zzzzzz'), [])
+        self.assertTrue(os.path.exists(os.path.join(tldr.get_cache_dir_path(), 'suggest.json')))
+
+        tldr.get_suggest_cache.cache_clear()
+        with unittest.mock.patch('tldr.get_trigrams', wraps=tldr.get_trigrams) as get_trigrams:
+            self.assertEqual(tldr.suggest_commands('airprot'), ['airport'])
+            get_trigrams.assert_called_once_with('airprot') # index not rebuilt
+
+        with unittest.mock.patch('tldr.load_cache') as load_cache:
+            self.assertEqual(tldr.suggest_commands('airprot'), ['airport'])
+            load_cache.assert_not_called() # loaded once per process
+
+        # a cold run reads the persisted names only
+        with unittest.mock.patch('tldr.get_command_index') as get_command_index:
+            self.assertEqual(tldr.suggest_commands('airprot'), ['airport'])
+            get_command_index.assert_not_called()
+
+    def test_get_page_path_map(self):
+        page_path_map = tldr.get_page_path_map(['du', 'tldr-test', 'not-exist'], 'default')
+        self.assertEqual(page_path_map['du'], tldr.get_page_path_list('du', 'default'))
+        self.assertEqual(page_path_map['tldr-test'], tldr.get_page_path_list('tldr-test', 'default'))
+        self.assertNotIn('not-exist', page_path_map)
+
+        # only the given commands are looked up, probed without the command index
+        with unittest.mock.patch('tldr.CommandIndex', side_effect=AssertionError):
+            self.assertEqual(list(tldr.get_page_path_map(['airport'], 'osx')), ['airport'])
+
+        command_list = ['airport', 'du', 'tcpflow', 'tldr-test']
+        page_path_map = tldr.get_page_path_map(command_list * tldr.BATCH_PROBE_MAX_COMMANDS, 'all')
+        self.assertEqual(sum([len(_) for _ in page_path_map.values()]), len(tldr.get_page_path_list(None, 'all')))
+        self.assertEqual(tldr.get_page_path_map(command_list, 'osx'), tldr.get_page_path_map(command_list * tldr.BATCH_PROBE_MAX_COMMANDS, 'osx'))
+
+    def test_action_batch_find(self):
+        stdin = io.StringIO('du\nnot-exist\n\n  tldr   test  \n')
+        stdout = io.StringIO()
+        with unittest.mock.patch('sys.stdin', stdin), contextlib.redirect_stdout(stdout), self.assertLogs(level='ERROR'):
+            self.assertRaises(SystemExit, tldr.action_batch_find, None, None)
+
+        output = stdout.getvalue()
+        separator_list = [_ for _ in output.splitlines() if _.startswith('==> ')]
+        self.assertEqual(separator_list, ['==> du <==', '==> not-exist <==', '==> tldr-test <=='])
+        self.assertIn('Not found: not-exist', output)
+        self.assertIn('Estimate file space usage', output)
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            tldr.action_batch_find(['du', 'airport', 'tldr test'], None)
+        self.assertIn('Wireless network configuration utility.', stdout.getvalue())
+        self.assertIn('==> tldr-test <==', stdout.getvalue())
+
+    def test_daemon(self):
+        with open(os.path.join(self.config_dir, 'tldr.config.json'), 'w') as f:
+            json.dump(ok_config, f)
+
+        env = dict(os.environ, TLDR_CONFIG_DIR=self.config_dir)
+        env.pop('TLDR_NO_DAEMON', None)
+        self.assertIsNone(tldr.run_daemon_client(['du']))
+        local_output = subprocess.run([sys.executable, tldr.__file__, 'du'], env=dict(env, TLDR_NO_DAEMON='1'), capture_output=True).stdout
+
+        daemon = subprocess.Popen([sys.executable, tldr.__file__, '--daemon'], env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            socket_path = tldr.get_daemon_socket_path()
+            for _ in range(100): # until listening, the socket file exists since bind()
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                    if client.connect_ex(socket_path) == 0:
+                        break
+                time.sleep(0.05)
+
+            def run(argv):
+                stdout = io.TextIOWrapper(io.BytesIO())
+                stderr = io.TextIOWrapper(io.BytesIO())
+                with unittest.mock.patch('sys.stdout', stdout), unittest.mock.patch('sys.stderr', stderr), unittest.mock.patch('tldr.DAEMON_TIMEOUT', 60): # slow if the machine is busy
+                    exit_code = tldr.run_daemon_client(argv)
+                return exit_code, stdout.buffer.getvalue(), stderr.buffer.getvalue()
+
+            exit_code, stdout, _ = run(['du'])
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(stdout, local_output)
+
+            exit_code, stdout, stderr = run(['not-exist'])
+            self.assertEqual(exit_code, 1)
+            self.assertEqual(stdout, b'')
+            self.assertIn(b'Command not found', stderr)
+
+            self.assertEqual(run(['--bad-arg'])[0], 2)
+
+            # a client which never sends is dropped, others are served after it
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as hung_client:
+                hung_client.connect(socket_path)
+                self.assertEqual(run(['du'])[0], 0)
+            self.assertIsNone(tldr.run_daemon_client(['--update']))
+            self.assertIsNone(tldr.run_daemon_client(['-lu']))
+            self.assertIsNone(tldr.run_daemon_client(['--upd']))
+            self.assertIsNone(tldr.run_daemon_client(['--compile-pack=a.tldrpack']))
+        finally:
+            daemon.send_signal(signal.SIGINT)
+            daemon.wait(5)
+
+        self.assertFalse(os.path.exists(socket_path))
+
+        # a hung daemon accepts and never replies
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        with server, unittest.mock.patch('tldr.DAEMON_TIMEOUT', 0.1):
+            server.bind(socket_path)
+            server.listen()
+            time_start = time.monotonic()
+            self.assertIsNone(tldr.run_daemon_client(['du']))
+            self.assertLess(time.monotonic() - time_start, 2)
+        os.unlink(socket_path)
+
+    def test_tracer(self):
+        self.assertIsNone(tldr.TRACER)
+        tldr.start_trace('json')
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                tldr.action_find('du', 'default')
+            report = json.loads(tldr.TRACER.get_report(['du']))
+        finally:
+            tldr.TRACER = None
+
+        self.assertEqual(report['argv'], ['du'])
+        self.assertEqual(report['phases']['lookup']['count'], 1)
+        self.assertEqual(report['phases']['parse']['count'], 2)
+        self.assertEqual(report['counters']['render_cache_miss'], 2)
+        self.assertEqual(report['counters']['page_read'], 2)
+        self.assertGreater(report['counters']['stat'], 0)
+
+        tracer = tldr.Tracer()
+        tracer.add_phase('index', 0.5)
+        tracer.count('stat', 3)
+        report = tracer.get_report(['tar'])
+        self.assertIn('index', report)
+        self.assertIn('500.000', report)
+        self.assertRegex(report, r'stat +3')
+
+        for value, expected in (('1', True), ('json', True), ('0', False), ('', False)):
+            with unittest.mock.patch.dict('os.environ', {'TLDR_TRACE': value}):
+                self.assertEqual(tldr.is_trace_env_set(), expected)
+
+    def test_action_prerender(self):
+        prerender_directory = os.path.join(self.config_dir, 'prerender')
+        with self.assertLogs(level='INFO'):
+            tldr.action_prerender(prerender_directory)
+
+        page_path = os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'linux', 'du.md')
+        self.assertIsNone(tldr.get_prerendered_page_path(page_path)) # prerender_directory not set
+
+        tldr.get_config.return_value['prerender_directory'] = prerender_directory
+        tldr.get_prerender_directory.cache_clear()
+        prerendered_page_path = tldr.get_prerendered_page_path(page_path)
+        with open(prerendered_page_path, 'rb') as f:
+            self.assertEqual(f.read(), tldr.get_rendered_page(page_path))
+
+        with contextlib.redirect_stdout(io.StringIO()) as f, unittest.mock.patch('tldr.parse_page') as parse_page:
+            tldr.action_find('du', 'linux')
+            parse_page.assert_not_called()
+        self.assertIn(tldr.get_rendered_page(page_path).decode('utf-8'), f.getvalue())
+
+        # stale after the style config changed
+        tldr.get_config.return_value['command_indent_size'] = 2
+        tldr.clear_style_caches()
+        self.assertIsNone(tldr.get_prerendered_page_path(page_path))
+
+        # not a prerender dir
+        with self.assertRaises(SystemExit), self.assertLogs(level='ERROR'):
+            tldr.action_prerender(ROOT)
+
+        # interrupted, without stamp.json
+        os.unlink(os.path.join(prerender_directory, 'stamp.json'))
+        os.makedirs(os.path.join(prerender_directory, 'pages.tmp', 'ab'))
+        with self.assertLogs(level='INFO'):
+            tldr.action_prerender(prerender_directory)
+        self.assertEqual(sorted(os.listdir(prerender_directory)), ['pages', 'stamp.json'])
+        tldr.get_prerender_directory.cache_clear()
+        self.assertTrue(os.path.isfile(tldr.get_prerendered_page_path(page_path)))
+
+    def test_page_pack(self):
+        pack_path = os.path.join(self.config_dir, 'pages.tldrpack')
+        repo_directory_list = ok_config['repo_directory_list']
+        with self.assertLogs(level='INFO'):
+            tldr.action_compile_pack(pack_path)
+
+        tldr.get_config.return_value['repo_directory_list'] = [pack_path]
+        self.assertEqual(tldr.get_repo_directory_list(), [os.path.join(pack_path, '0'), os.path.join(pack_path, '1')])
+        for i, repo_directory in enumerate(repo_directory_list):
+            self.assertEqual(sorted(tldr.get_index(os.path.join(pack_path, str(i)))), sorted(tldr.get_index(repo_directory)))
+
+        result_expected = [
+            os.path.join(pack_path, '0', 'common', 'tldr-test.md'),
+            os.path.join(pack_path, '1', 'common', 'tldr-test.md'),
+        ]
+        self.assertEqual(tldr.get_page_path_list('tldr-test', 'default'), result_expected)
+        self.assertEqual(len(tldr.get_page_path_list(None, 'all')), 7)
+        self.assertEqual(tldr.get_page_path_list('not-exist', 'default'), [])
+
+        page_path = os.path.join(pack_path, '0', 'linux', 'du.md')
+        self.assertEqual(tldr.parse_page(page_path), tldr.parse_page(os.path.join(repo_directory_list[0], 'linux', 'du.md')))
+        self.assertEqual(tldr.get_rendered_page(page_path), tldr.get_rendered_page(os.path.join(repo_directory_list[0], 'linux', 'du.md')))
+        self.assertFalse(tldr.page_exists(os.path.join(pack_path, '0', 'linux', 'airport.md')))
+        self.assertEqual(tldr.search_pages('wireless')[0]['page_path'], os.path.join(pack_path, '0', 'osx', 'airport.md'))
+
+    def test_zip_pages(self):
+        repo_directory_list = ok_config['repo_directory_list']
+        zip_path = os.path.join(self.config_dir, 'tldr.zip')
+        with zipfile.ZipFile(zip_path, 'w') as f:
+            for i, repo_directory in enumerate(repo_directory_list):
+                for platform, command in tldr.get_index(repo_directory):
+                    page_path = os.path.join(repo_directory, platform, command + '.md')
+                    compress_type = zipfile.ZIP_DEFLATED if i == 0 else zipfile.ZIP_STORED
+                    f.write(page_path, f'pages{".zh" * i}/{platform}/{command}.md', compress_type=compress_type)
+
+        config = copy.deepcopy(ok_config)
+        config['repo_directory_list'] = [zip_path, os.path.join(zip_path, 'pages.zh')]
+        tldr.check_config(config)
+        client = tldr.TldrClient(config, color=False)
+        self.assertEqual(len(client.find('tldr-test')), 2)
+        self.assertFalse(os.path.exists(os.path.join(tldr.get_cache_dir_path(), 'zip'))) # not persistent
+
+        tldr.get_config.return_value = config
+        zip_repo_directory_list = [os.path.join(zip_path, 'pages'), os.path.join(zip_path, 'pages.zh')]
+        self.assertEqual(tldr.get_repo_directory_list(), zip_repo_directory_list)
+
+        for repo_directory, zip_repo_directory in zip(repo_directory_list, zip_repo_directory_list):
+            self.assertEqual(sorted(tldr.get_index(zip_repo_directory)), sorted(tldr.get_index(repo_directory)))
+            for platform, command in tldr.get_index(repo_directory):
+                page_path = os.path.join(repo_directory, platform, command + '.md')
+                zip_page_path = os.path.join(zip_repo_directory, platform, command + '.md')
+                self.assertEqual(tldr.parse_page(zip_page_path), tldr.parse_page(page_path))
+
+        self.assertEqual(tldr.get_page_path_list('tldr-test', 'default'), [os.path.join(_, 'common', 'tldr-test.md') for _ in zip_repo_directory_list])
+        self.assertEqual(tldr.get_page_path_list('not-exist', 'default'), [])
+        self.assertFalse(tldr.page_exists(os.path.join(zip_path, 'pages', 'linux', 'airport.md')))
+
+        # the central directory is read once, and cached across runs
+        tldr.open_zip.cache_clear()
+        with unittest.mock.patch('zipfile.ZipFile', side_effect=AssertionError):
+            self.assertEqual(len(tldr.get_page_path_list(None, 'all')), 7)
+
+    def test_action_update(self):
+        def git(*args, cwd=self.config_dir):
+            subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@localhost'] + list(args), cwd=cwd, check=True, capture_output=True)
+
+        remote_path = os.path.join(self.config_dir, 'remote.git')
+        upstream_path = os.path.join(self.config_dir, 'upstream')
+        repo_path_list = [os.path.join(self.config_dir, f'clone{i}') for i in range(3)]
+        git('init', '--bare', remote_path)
+        git('clone', remote_path, upstream_path)
+        shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages1'), os.path.join(upstream_path, 'pages'))
+        git('add', '.', cwd=upstream_path)
+        git('commit', '-m', 'init', cwd=upstream_path)
+        git('push', 'origin', 'HEAD', cwd=upstream_path)
+        for repo_path in repo_path_list:
+            git('clone', remote_path, repo_path)
+
+        shutil.copy(os.path.join(upstream_path, 'pages', 'linux', 'du.md'), os.path.join(upstream_path, 'pages', 'linux', 'dust.md'))
+        with open(os.path.join(upstream_path, 'pages', 'linux', 'du.md'), 'a', encoding='utf-8') as f:
+            f.write('\n- New example:\n\n`du -h`\n')
+        git('rm', os.path.join('pages', 'osx', 'airport.md'), cwd=upstream_path)
+        git('mv', os.path.join('pages', 'linux', 'tcpflow.md'), os.path.join('pages', 'linux', 'tcpdump.md'), cwd=upstream_path)
+        git('add', '.', cwd=upstream_path)
+        git('commit', '-m', 'change pages', cwd=upstream_path)
+        git('push', 'origin', 'HEAD', cwd=upstream_path)
+
+        repo_directory_list = [os.path.join(_, 'pages') for _ in repo_path_list]
+        repo_directory_list.append(self.config_dir) # not a git repo
+        tldr.get_config.return_value['repo_directory_list'] = repo_directory_list
+        tldr.get_search_index() # build the persistent index and search index before pull
+        old_render_cache_path = tldr.get_render_cache_path(os.path.join(repo_directory_list[0], 'linux', 'du.md'))
+        tldr.get_rendered_page(os.path.join(repo_directory_list[0], 'linux', 'du.md'))
+        self.assertTrue(os.path.exists(old_render_cache_path))
+        cwd = os.getcwd()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result_list = tldr.action_update()
+        self.assertEqual(os.getcwd(), cwd)
+
+        self.assertEqual([_['repo_directory'] for _ in result_list], repo_directory_list)
+        self.assertEqual([_['return_code'] for _ in result_list[:3]], [0, 0, 0])
+        self.assertNotEqual(result_list[3]['return_code'], 0)
+        for repo_directory in repo_directory_list[:3]:
+            self.assertTrue(os.path.exists(os.path.join(repo_directory, 'linux', 'dust.md')))
+
+        changes = {'added': ['linux/dust', 'linux/tcpdump'], 'modified': ['linux/du'], 'deleted': ['linux/tcpflow', 'osx/airport']}
+        self.assertEqual(result_list[0]['changes'], {repo_directory_list[0]: changes})
+        self.assertIsNone(result_list[3]['changes'])
+        manifest = tldr.load_cache('changes.json', tldr.UPDATE_CHANGES_VERSION)
+        self.assertEqual([_['repo_directory'] for _ in manifest['repos']], repo_directory_list[:3])
+        self.assertEqual(manifest['repos'][0]['deleted'], [os.path.join(repo_directory_list[0], 'linux', 'tcpflow.md'), os.path.join(repo_directory_list[0], 'osx', 'airport.md')])
+
+        # changes are applied, nothing is rebuilt from scratch
+        self.assertFalse(os.path.exists(old_render_cache_path))
+        self.assertTrue(os.path.exists(tldr.get_render_cache_path(os.path.join(repo_directory_list[0], 'linux', 'du.md'))))
+        tldr.get_index.cache_clear()
+        tldr.get_index_cache.cache_clear()
+        tldr.get_search_index.cache_clear()
+        build_index = tldr.build_index
+        def build_index_not_git(repo_directory): # the config dir is changed by the caches in it
+            self.assertEqual(repo_directory, self.config_dir)
+            return build_index(repo_directory)
+
+        with unittest.mock.patch('tldr.build_index', side_effect=build_index_not_git), unittest.mock.patch('tldr.get_page_search_doc', side_effect=AssertionError):
+            self.assertEqual(sorted(tldr.get_index(repo_directory_list[0])), [('common', 'tldr-test'), ('linux', 'du'), ('linux', 'dust'), ('linux', 'tcpdump'), ('osx', 'du')])
+            self.assertEqual(tldr.search_pages('new example')[0]['command'], 'du')
+
+    def test_update_repo_timeout(self):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = tldr.update_repo(self.config_dir, ['sleep', '10'], 0.2, threading.Lock())
+        self.assertTrue(result['timeout'])
+        self.assertNotEqual(result['return_code'], 0)
+        self.assertLess(result['time_used'], 5)
+
     def test_get_page_path_list(self):
         result_expected = [
             os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'common', 'tldr-test.md'),
@@ -260,6 +881,274 @@ class TestsWithConfig(unittest.TestCase):
         result = tldr.get_page_path_list(None, 'common')
         self.assertEqual(sorted(result_expected), sorted(result))
 
+    def test_language_list(self):
+        with unittest.mock.patch.dict(os.environ, {'LANG': 'zh_CN.UTF-8', 'LANGUAGE': 'pt_BR:de'}):
+            self.assertEqual(tldr.get_language_list(), ['pt_BR', 'pt', 'de', 'zh_CN', 'zh', 'en'])
+            self.assertEqual(tldr.get_language_list(['de', 'en', 'zh']), ['de', 'en', 'zh'])
+        with unittest.mock.patch.dict(os.environ, {'LANG': 'C.UTF-8', 'LANGUAGE': ''}):
+            self.assertEqual(tldr.get_language_list(), ['en'])
+
+        # a repo root, like a clone of tldr-pages/tldr
+        root_path = os.path.join(self.config_dir, 'tldr')
+        shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages1'), os.path.join(root_path, 'pages'))
+        shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages2'), os.path.join(root_path, 'pages.zh'))
+        shutil.copytree(os.path.join(ROOT, 'tldr-pages-test', 'pages2'), os.path.join(root_path, 'pages.de'))
+        os.makedirs(os.path.join(root_path, 'scripts'))
+
+        pages1 = os.path.join(ROOT, 'tldr-pages-test', 'pages1')
+        self.assertEqual(tldr.expand_repo_directory_list([root_path, pages1], ['zh', 'fr', 'en']), [os.path.join(root_path, 'pages.zh'), os.path.join(root_path, 'pages'), pages1])
+        self.assertEqual(tldr.expand_repo_directory_list([root_path], ['fr']), [])
+
+        tldr.get_config.return_value['repo_directory_list'] = [root_path]
+        tldr.get_config.return_value['language_list'] = ['de']
+        tldr.check_config(tldr.get_config())
+        self.assertEqual(tldr.get_page_path_list('tldr-test', 'all'), [
+            os.path.join(root_path, 'pages.de', 'common', 'tldr-test.md'),
+            os.path.join(root_path, 'pages.de', 'sunos', 'tldr-test.md'),
+        ])
+        self.assertRaises(AssertionError, tldr.check_config, dict(tldr.get_config(), language_list=['../x']))
+
+        # English is shown only if no other language has the command, other repos are not affected
+        tldr.get_config.return_value['repo_directory_list'] = [root_path, pages1]
+        tldr.get_client.cache_clear()
+        self.assertEqual(tldr.get_page_path_list('tldr-test', 'default'), [
+            os.path.join(root_path, 'pages.de', 'common', 'tldr-test.md'),
+            os.path.join(pages1, 'common', 'tldr-test.md'),
+        ])
+        self.assertEqual(tldr.get_page_path_list('du', 'linux'), [os.path.join(root_path, 'pages', 'linux', 'du.md'), os.path.join(pages1, 'linux', 'du.md')])
+        self.assertEqual(tldr.get_page_path_map(['tldr-test', 'du'], 'all'), {
+            'tldr-test': tldr.get_page_path_list('tldr-test', 'all'),
+            'du': tldr.get_page_path_list('du', 'all'),
+        })
+        self.assertEqual(len(tldr.get_page_path_list('tldr-test', 'all')), 3)
+
+        client = tldr.TldrClient(dict(tldr.get_config(), repo_directory_list=[root_path], language_list=['fr', 'de']), color=False)
+        self.assertEqual(client.list_pages('tldr-test', 'common'), [os.path.join(root_path, 'pages.de', 'common', 'tldr-test.md')])
+        self.assertFalse(client.refresh())
+        shutil.copytree(os.path.join(root_path, 'pages.zh'), os.path.join(root_path, 'pages.fr'))
+        self.assertTrue(client.refresh())
+        self.assertEqual(client.list_pages('tldr-test', 'common'), [os.path.join(root_path, 'pages.fr', 'common', 'tldr-test.md')])
+
+    def test_command_index(self):
+        pages1 = os.path.join(ROOT, 'tldr-pages-test', 'pages1')
+        pages2 = os.path.join(ROOT, 'tldr-pages-test', 'pages2')
+        command_index = tldr.get_command_index()
+        self.assertEqual(command_index.commands, ['airport', 'du', 'tcpflow', 'tldr-test'])
+        self.assertEqual(command_index.platforms, ['common', 'linux', 'osx', 'sunos'])
+        self.assertEqual(command_index.masks['tldr-test'], 0b1001_0001)
+        self.assertEqual(command_index.get_commands_by_prefix('t'), ['tcpflow', 'tldr-test'])
+        self.assertEqual(command_index.get_commands_by_prefix('tldr-test-'), [])
+        self.assertEqual(command_index.get_page_path_list('du', ['osx', 'linux', 'osx']), [os.path.join(pages1, 'osx', 'du.md'), os.path.join(pages1, 'linux', 'du.md')])
+        self.assertEqual(command_index.get_page_path_list('du', ['windows']), [])
+        self.assertEqual(command_index.get_page_path_list('not-exist'), [])
+
+        result_expected = [
+            os.path.join(pages1, 'common', 'tldr-test.md'),
+            os.path.join(pages1, 'linux', 'du.md'),
+            os.path.join(pages1, 'linux', 'tcpflow.md'),
+            os.path.join(pages1, 'osx', 'airport.md'),
+            os.path.join(pages1, 'osx', 'du.md'),
+            os.path.join(pages2, 'common', 'tldr-test.md'),
+            os.path.join(pages2, 'sunos', 'tldr-test.md'),
+        ]
+        self.assertEqual(tldr.get_page_path_list(None, 'all'), result_expected)
+        self.assertEqual(tldr.get_page_path_list('tldr-test', 'all'), [result_expected[0], result_expected[5], result_expected[6]])
+
+    def test_tldr_client(self):
+        import concurrent.futures
+
+        pages1 = os.path.join(ROOT, 'tldr-pages-test', 'pages1')
+        config = copy.deepcopy(ok_config)
+        client = tldr.TldrClient(config, color=False, render_cache_size=1)
+        config['platform_list'] = [] # the client owns a copy
+
+        result = client.find('du')
+        self.assertEqual([(_['platform'], _['repo_directory']) for _ in result], [('osx', pages1), ('linux', pages1)])
+        self.assertEqual(result[1]['text'], tldr.render_page(result[1]['page_path'], client.page_style).decode('utf-8'))
+        self.assertNotIn('\x1b', result[1]['text'])
+        self.assertEqual(client.find('du', 'linux', render=False)[0]['text'], None)
+        self.assertEqual(client.find('not-exist'), [])
+        self.assertEqual(client.complete('t'), ['tcpflow', 'tldr-test'])
+        self.assertEqual(client.complete('', 'sunos'), ['tldr-test'])
+        self.assertEqual(len(client.list_pages(None, 'all')), 7)
+        self.assertEqual(len(client.render_cache), 1)
+        with self.assertRaises(OSError):
+            client.render(os.path.join(pages1, 'linux', 'not-exist.md'))
+
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            result_list = list(executor.map(lambda command: client.find(command, 'all'), ['du', 'tldr-test', 'airport'] * 20))
+        self.assertEqual(result_list[:3] * 20, result_list)
+
+        # a page added to a repo is found after refresh()
+        repo_path = os.path.join(self.config_dir, 'pages')
+        shutil.copytree(pages1, repo_path)
+        client.reload(dict(config, repo_directory_list=[repo_path]))
+        self.assertEqual(client.complete('n'), [])
+        self.assertFalse(client.refresh())
+        shutil.copy(os.path.join(repo_path, 'linux', 'du.md'), os.path.join(repo_path, 'linux', 'new-du.md'))
+        os.utime(os.path.join(repo_path, 'linux'), ns=(0, 0))
+        self.assertTrue(client.refresh())
+        self.assertEqual(client.complete('n', 'all'), ['new-du'])
+        self.assertFalse(os.path.exists(tldr.get_cache_dir_path())) # not persistent
+
+        # a cold index build does not block other threads
+        client = tldr.TldrClient(dict(config, repo_directory_list=[repo_path]), color=False)
+        page_path = os.path.join(repo_path, 'linux', 'du.md')
+        event = threading.Event()
+        load_index = tldr.load_index
+        def load_index_slow(*args):
+            event.wait(5)
+            return load_index(*args)
+
+        with unittest.mock.patch('tldr.load_index', side_effect=load_index_slow):
+            thread = threading.Thread(target=client.get_command_index)
+            thread.start()
+            self.assertIn('du', client.render(page_path))
+            self.assertTrue(thread.is_alive())
+            event.set()
+            thread.join()
+        self.assertEqual(client.complete('n', 'all'), ['new-du'])
+
+        with self.assertRaises(ValueError):
+            tldr.TldrClient(dict(config, command_indent_size=-1))
+        with self.assertRaises(ValueError):
+            tldr.TldrClient({}) # KeyError
+        with self.assertRaises(ValueError):
+            tldr.TldrClient([]) # TypeError
+        with self.assertRaises(ValueError):
+            tldr.TldrClient(dict(config, colors=None))
+        with self.assertRaises(ValueError):
+            tldr.TldrClient() # no config file
+        with open(tldr.get_config_path(), 'w') as f:
+            f.write('{')
+        with self.assertRaises(ValueError):
+            tldr.TldrClient()
+
+    def test_handle_serve_request(self):
+        client = tldr.TldrClient(copy.deepcopy(ok_config), color=False)
+
+        status, headers, body = tldr.handle_serve_request(client, '/page/du?format=json')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'application/json; charset=utf-8')
+        self.assertEqual([_['platform'] for _ in json.loads(body)], ['osx', 'linux'])
+        etag = headers['ETag']
+
+        status, headers, body = tldr.handle_serve_request(client, '/page/du?format=json', etag)
+        self.assertEqual((status, headers['ETag'], body), (304, etag, b''))
+        self.assertEqual(tldr.handle_serve_request(client, '/page/du?format=json', 'W/' + etag)[0], 304)
+        self.assertEqual(tldr.handle_serve_request(client, '/page/du?format=text', etag)[0], 200)
+
+        status, headers, body = tldr.handle_serve_request(client, '/page/tldr-test?platform=all')
+        self.assertEqual(status, 200)
+        self.assertEqual(body.count(b'<pre>'), 3)
+
+        status, headers, body = tldr.handle_serve_request(client, '/list?platform=sunos&format=text')
+        self.assertEqual(body.decode('utf-8'), os.path.join(ROOT, 'tldr-pages-test', 'pages2', 'sunos', 'tldr-test.md') + '\n')
+        self.assertEqual(tldr.handle_serve_request(client, '/list', headers['ETag'])[0], 200)
+        self.assertEqual(tldr.handle_serve_request(client, '/list?platform=sunos&format=text', headers['ETag'])[0], 304)
+        self.assertIn(b'href="/page/airport?platform=osx"', tldr.handle_serve_request(client, '/list?glob=a*')[2])
+
+        status, headers, body = tldr.handle_serve_request(client, '/search?q=disk+usage&format=json')
+        self.assertEqual(status, 200)
+        self.assertIn('du', [_['command'] for _ in json.loads(body)])
+
+        self.assertEqual(tldr.handle_serve_request(client, '/page/not-exist')[0], 404)
+        self.assertEqual(tldr.handle_serve_request(client, '/page/du?format=xml')[0], 400)
+        self.assertEqual(tldr.handle_serve_request(client, '/list?regex=(')[0], 400)
+        self.assertEqual(tldr.handle_serve_request(client, '/search')[0], 400)
+        self.assertEqual(tldr.handle_serve_request(client, '/')[0], 404)
+
+        # a platform must not escape from the repo
+        secret_directory = os.path.join(self.config_dir, 'secret')
+        os.makedirs(secret_directory)
+        with open(os.path.join(secret_directory, 'du.md'), 'w') as f:
+            f.write('# secret\n')
+        platform = urllib.parse.quote(os.path.relpath(secret_directory, os.path.join(ROOT, 'tldr-pages-test', 'pages1')))
+        self.assertEqual(tldr.handle_serve_request(client, f'/page/du?platform={platform}&format=text')[0], 400)
+        self.assertEqual(tldr.handle_serve_request(client, f'/list?platform={platform}&command=du')[0], 400)
+        self.assertEqual(tldr.handle_serve_request(client, '/list?platform=.&command=du')[0], 400)
+        with self.assertRaises(ValueError):
+            client.find('du', urllib.parse.unquote(platform))
+        self.assertEqual(tldr.probe_page_path_list(ok_config['repo_directory_list'], [urllib.parse.unquote(platform), 'linux'], 'du'), [os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'linux', 'du.md')])
+
+    def test_serve(self):
+        import urllib.request
+        import urllib.error
+
+        server = tldr.make_serve_server(tldr.TldrClient(copy.deepcopy(ok_config), color=False), 0)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = 'http://%s:%d/page/du?format=text' % server.server_address[:2]
+            with urllib.request.urlopen(url) as response:
+                self.assertTrue(response.read().startswith(b'du - '))
+                etag = response.headers['ETag']
+
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                urllib.request.urlopen(urllib.request.Request(url, headers={'If-None-Match': etag}))
+            self.assertEqual(cm.exception.code, 304)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_complete_commands(self):
+        self.assertEqual(tldr.complete_commands('t'), ['tcpflow', 'tldr-test'])
+        self.assertEqual(tldr.complete_commands('', 'all'), ['airport', 'du', 'tcpflow', 'tldr-test'])
+        self.assertEqual(tldr.complete_commands('', 'sunos'), ['tldr-test'])
+        self.assertEqual(tldr.complete_commands('d', 'common'), [])
+        self.assertEqual(tldr.complete_commands('not-exist', 'all'), [])
+        self.assertTrue(os.path.exists(os.path.join(tldr.get_cache_dir_path(), 'complete.json')))
+
+        # a cold run reads the persisted names only
+        tldr.get_client.cache_clear()
+        with unittest.mock.patch('tldr.CommandIndex', side_effect=AssertionError):
+            self.assertEqual(tldr.complete_commands('a', 'osx'), ['airport'])
+
+    def test_get_completion_script(self):
+        for shell in ('bash', 'zsh', 'fish'):
+            self.assertIn('tldr --complete=', tldr.get_completion_script(shell))
+
+        if shutil.which('bash'):
+            subprocess.run(['bash', '-n'], input=tldr.get_completion_script('bash').encode('utf-8'), check=True)
+
+    def test_iter_page_path(self):
+        pages1 = os.path.join(ROOT, 'tldr-pages-test', 'pages1')
+        pages2 = os.path.join(ROOT, 'tldr-pages-test', 'pages2')
+        page_path_iter = tldr.iter_page_path()
+        self.assertIsInstance(next(page_path_iter), str)
+        self.assertEqual(sorted(tldr.iter_page_path()), sorted(tldr.get_page_path_list(None, 'all')))
+        self.assertEqual(sorted(tldr.iter_page_path(None, 'default')), sorted(tldr.get_page_path_list(None, 'default')))
+        self.assertEqual(sorted(tldr.iter_page_path('tldr-test', 'common')), [os.path.join(pages1, 'common', 'tldr-test.md'), os.path.join(pages2, 'common', 'tldr-test.md')])
+        self.assertEqual(sorted(tldr.iter_page_path(glob='t*', platform='linux')), [os.path.join(pages1, 'linux', 'tcpflow.md')])
+        self.assertEqual(sorted(tldr.iter_page_path(regex='^d')), [os.path.join(pages1, 'linux', 'du.md'), os.path.join(pages1, 'osx', 'du.md')])
+        self.assertEqual(list(tldr.iter_page_path('tldr-test', 'common', unique=True)), [os.path.join(pages1, 'common', 'tldr-test.md')])
+
+        # a literal prefix or a command looks up the command index, not the index of each repo
+        with unittest.mock.patch.object(tldr.TldrClient, 'get_index', side_effect=AssertionError):
+            self.assertEqual(list(tldr.iter_page_path(regex='^tcp', platform='linux')), [os.path.join(pages1, 'linux', 'tcpflow.md')])
+            self.assertEqual(list(tldr.iter_page_path(glob='d?', platform='all', unique=True)), [os.path.join(pages1, 'linux', 'du.md'), os.path.join(pages1, 'osx', 'du.md')])
+            self.assertEqual(list(tldr.iter_page_path('du', 'all', glob='x*')), [])
+            self.assertEqual(len(list(tldr.iter_page_path('tldr-test'))), 3)
+
+        with contextlib.redirect_stdout(io.StringIO()) as f:
+            tldr.action_list_command(None, 'default', glob='*u*', sort=True, null=True)
+        self.assertEqual(f.getvalue(), '\0'.join([os.path.join(pages1, 'linux', 'du.md'), os.path.join(pages1, 'osx', 'du.md')]) + '\0')
+
+        with self.assertRaises(SystemExit), self.assertLogs(level='ERROR'):
+            tldr.action_list_command(None, None, regex='(')
+
+    def test_get_page_path_list_fast_path(self):
+        result_expected = [
+            os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'osx', 'du.md'),
+            os.path.join(ROOT, 'tldr-pages-test', 'pages1', 'linux', 'du.md'),
+        ]
+        # no index of any repo, nor the command index, is built
+        with unittest.mock.patch('tldr.load_index', side_effect=AssertionError), unittest.mock.patch('tldr.CommandIndex', side_effect=AssertionError):
+            self.assertEqual(tldr.get_page_path_list('du', 'default'), result_expected)
+            self.assertEqual(tldr.get_page_path_list('not-exist', 'linux'), [])
+            self.assertEqual(tldr.get_page_path_list('../osx/du', 'linux'), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -13,16 +13,13 @@ https://github.com/Phuker/multi-tldr
 import os
 import sys
 import re
-import json
 import logging
-import argparse
-import subprocess
 import functools
+import threading # imported by logging anyway
 
-# buggy: https://github.com/pallets/click/issues/665
-# import readline
-
-import click
+# Keep startup fast, tldr is often called in loops by scripts.
+# These modules are imported where they are used:
+# json, argparse, subprocess, hashlib, tempfile, zipfile, zlib, click (only for --init)
 
 
 __title__ = "multi-tldr"
@@ -50,11 +47,175 @@ DEFAULT_CONFIG = {
     'compact_output': False,
 }
 
+# bump when the format of a persistent cache file changes
+INDEX_CACHE_VERSION = 2
+RENDER_CACHE_VERSION = 1
+PAGE_HASH_CACHE_VERSION = 1 # hashes.json, content hashes of pages, see get_page_hash_list()
+
+# rendered pages cache, least recently used pages are evicted beyond this size
+RENDER_CACHE_MAX_SIZE = 8 * 1024 * 1024
+RENDER_MEMORY_CACHE_SIZE = 256 # pages, in memory of a TldrClient, matters for the daemon
+
+# tldr --update, repos are pulled concurrently
+UPDATE_MAX_WORKERS = 4
+UPDATE_TIMEOUT = 300 # seconds, per repo
+UPDATE_CHANGES_VERSION = 1 # changes.json in the cache dir, pages changed by the last --update
+
+# tldr --prerender, all pages rendered ahead of time
+PRERENDER_VERSION = 1
+PRERENDER_CHUNK_SIZE = 64 # pages, per task of a worker process
+PRERENDER_NAME_SET = frozenset(('stamp.json', 'pages', 'pages.tmp', 'pages.old')) # all in a prerender dir, the last 2 left by an interrupted run
+
+# tldr --compile-pack, see PagePack
+PACK_SUFFIX = '.tldrpack'
+PACK_MAGIC = b'TLDRPACK'
+PACK_VERSION = 1
+PACK_HEADER_FORMAT = '<8sIIQQQQQ' # magic, version, entry_count, meta_offset, meta_size, table_offset, names_offset, bodies_offset
+PACK_RECORD_FORMAT = '<IHHHHQI'
+
+# zip archive in repo_directory_list, e.g. the official tldr.zip, see ZipPages
+ZIP_SUFFIX = '.zip'
+ZIP_INDEX_VERSION = 1
+ZIP_LOCAL_HEADER_FORMAT = '<4s22xHH' # signature, ..., file name length, extra field length
+ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# tldr --complete, names of all commands for shell completion
+COMPLETE_INDEX_VERSION = 1
+PLATFORM_CHOICES = ('common', 'linux', 'osx', 'sunos', 'windows', 'all', 'default')
+
+# tldr --batch
+BATCH_PROBE_MAX_COMMANDS = 16 # more commands are looked up in the command index, fewer are probed page by page
+
+# tldr --daemon
+DAEMON_SEND_BUFFER_SIZE = 64 * 1024
+DAEMON_TIMEOUT = 5.0 # seconds, per socket operation, a client runs in process if the daemon hangs, the daemon drops a client which hangs
+DAEMON_FORWARD_ENV_LIST = ('TERM', 'DEBUG', 'TLDR_NO_CACHE')
+DAEMON_LOCAL_OPTION_LIST = ('--init', '--update', '--daemon', '--serve', '--compile-pack', '--prerender', '--profile')
+
+# tldr --serve
+SERVE_HOST = '127.0.0.1' # localhost only
+SERVE_DEFAULT_PORT = 8010
+SERVE_REFRESH_INTERVAL = 1.0 # seconds, repos are checked for changes at most once in it
+SERVE_FORMAT_LIST = ('html', 'text', 'json')
+
+# "did you mean" when command not found
+SUGGEST_INDEX_VERSION = 1
+SUGGEST_MAX_RESULTS = 5
+SUGGEST_MAX_CANDIDATES = 30 # by shared trigrams, before ranked by similarity
+SUGGEST_MIN_RATIO = 0.7
+
+# tldr --search
+SEARCH_INDEX_VERSION = 2
+SEARCH_INDEX_SHARD_COUNT = 64
+SEARCH_DOC_SHARD_SIZE = 256 # docs per file of the doc table, a query loads only those of its results
+SEARCH_MAX_RESULTS = 20
+SEARCH_WORD_RE = re.compile(r'\w+')
+SEARCH_STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it',
+    'of', 'on', 'or', 'the', 'to', 'with',
+))
+
 if sys.flags.optimize > 0:
     print('Error: Do not run with "-O", assert require no optimize', file=sys.stderr)
     sys.exit(1)
 
 
+class Tracer:
+    """Phase timers and counters of one run, enabled by TLDR_TRACE environment variable or --profile.
+
+    Output to stderr, or appended to the file in TLDR_TRACE_FILE environment variable,
+    as a human summary, or as one JSON line if TLDR_TRACE is 'json'.
+    """
+
+    def __init__(self, output_format='text'):
+        import time
+
+        self.perf_counter = time.perf_counter
+        self.output_format = output_format
+        self.time_start = self.perf_counter()
+        self.phases = {} # {name: [count, seconds], }
+        self.counters = {} # {name: value, }
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_phase(self, name, seconds):
+        phase = self.phases.setdefault(name, [0, 0.0])
+        phase[0] += 1
+        phase[1] += seconds
+
+    def get_report(self, argv):
+        import json
+
+        total_ms = (self.perf_counter() - self.time_start) * 1000
+        if self.output_format == 'json':
+            report = {
+                'argv': argv,
+                'total_ms': round(total_ms, 3),
+                'phases': {name: {'count': count, 'ms': round(seconds * 1000, 3)} for name, (count, seconds) in self.phases.items()},
+                'counters': self.counters,
+            }
+            return json.dumps(report) + '\n'
+
+        line_list = [f'Trace: {" ".join(argv)!r}, total {total_ms:.2f} ms']
+        line_list.append(f'  {"phase":<24}{"count":>8}{"ms":>12}')
+        for name, (count, seconds) in sorted(self.phases.items(), key=lambda item: -item[1][1]):
+            line_list.append(f'  {name:<24}{count:>8}{seconds * 1000:>12.3f}')
+        line_list.append(f'  {"counter":<24}{"value":>8}')
+        for name, value in sorted(self.counters.items()):
+            line_list.append(f'  {name:<24}{value:>8}')
+
+        return '\n'.join(line_list) + '\n'
+
+    def report(self, argv):
+        report = self.get_report(argv)
+        trace_file_path = os.environ.get('TLDR_TRACE_FILE')
+        if trace_file_path:
+            with open(trace_file_path, 'a', encoding='utf-8') as f:
+                f.write(report)
+        else:
+            sys.stderr.flush()
+            sys.stderr.write(report)
+
+
+TRACER = None # a Tracer if enabled, checked by instrumented code, costs nearly nothing if disabled
+
+
+def is_trace_env_set():
+    """TLDR_TRACE is set to anything but empty or '0'"""
+
+    return os.environ.get('TLDR_TRACE', '') not in ('', '0')
+
+
+def start_trace(output_format='text'):
+    global TRACER
+
+    if TRACER is None:
+        TRACER = Tracer(output_format)
+
+
+def trace_phase(name):
+    """Decorator, time each call of a function as a phase if tracing is enabled"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if TRACER is None:
+                return func(*args, **kwargs)
+
+            time_start = TRACER.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                TRACER.add_phase(name, TRACER.perf_counter() - time_start)
+
+        return wrapper
+
+    return decorator
+
+
 def get_config_dir_path():
     sub_dir_name = 'multi-tldr'
     if 'TLDR_CONFIG_DIR' in os.environ:
@@ -73,6 +234,77 @@ def get_config_path():
     return os.path.join(get_config_dir_path(), 'tldr.config.json')
 
 
+def get_cache_dir_path():
+    return os.path.join(get_config_dir_path(), 'cache')
+
+
+@trace_phase('cache.load')
+def load_cache(name, version):
+    """Load a persistent cache file, return None if missing, broken or outdated"""
+
+    log = logging.getLogger(__name__)
+
+    if 'TLDR_NO_CACHE' in os.environ:
+        return None
+
+    import json
+
+    cache_path = os.path.join(get_cache_dir_path(), name)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+            if TRACER is not None:
+                TRACER.count('cache_read_bytes', f.tell())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.debug('Ignore broken cache file %r: %r %r', cache_path, type(e), e)
+        return None
+
+    if type(cache) != dict or cache.get('version') != version:
+        log.debug('Ignore outdated cache file %r', cache_path)
+        return None
+
+    return cache.get('data')
+
+
+def write_file_atomic(file_path, data):
+    """Write bytes to a file atomically, concurrent writers never leave a half written file"""
+
+    import tempfile
+
+    dir_path = os.path.dirname(file_path)
+    os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=dir_path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_cache(name, version, data):
+    """Write a persistent cache file, failure is not fatal"""
+
+    log = logging.getLogger(__name__)
+
+    if 'TLDR_NO_CACHE' in os.environ:
+        return
+
+    import json
+
+    cache_path = os.path.join(get_cache_dir_path(), name)
+    try:
+        cache_str = json.dumps({'version': version, 'data': data}, ensure_ascii=False, separators=(',', ':'))
+        write_file_atomic(cache_path, cache_str.encode('utf-8'))
+        log.debug('Wrote cache file: %r', cache_path)
+    except Exception as e:
+        log.debug('Error when write cache file %r: %r %r', cache_path, type(e), e)
+
+
+@trace_phase('config.check')
 def check_config(config):
     assert type(config) == dict, 'type(config) != dict'
     assert type(config['color_output']) == str, 'type(color_output) != str'
@@ -96,15 +328,25 @@ def check_config(config):
     for platform in config['platform_list']:
         assert type(platform) == str, f'Bad item in platform_list: {platform!r}'
     
+    if config.get('prerender_directory') is not None: # optional
+        assert type(config['prerender_directory']) == str, 'type(prerender_directory) != str'
+
+    if config.get('language_list') is not None: # optional
+        assert type(config['language_list']) == list, 'type(language_list) != list'
+        for language in config['language_list']:
+            assert type(language) == str and re.fullmatch(r'[A-Za-z_]+', language), f'Bad item in language_list: {language!r}'
+
     for _repo_dir in config['repo_directory_list']:
         assert type(_repo_dir) == str, f'Bad item in repo_directory_list: {_repo_dir!r}'
-        if not os.path.exists(_repo_dir):
+        if not os.path.exists(_repo_dir) and split_zip_path(_repo_dir) is None:
             raise ValueError(f"Path in repo_directory_list not exist: {_repo_dir!r}")
 
 
 def load_json(file_path):
     assert type(file_path) == str
 
+    import json
+
     log = logging.getLogger(__name__)
 
     try:
@@ -117,6 +359,7 @@ def load_json(file_path):
 
 
 @functools.lru_cache
+@trace_phase('config')
 def get_config():
     """Get the configurations and return it as a dict."""
 
@@ -140,19 +383,65 @@ def get_config():
         return DEFAULT_CONFIG
 
 
-def style(text, *args, **kwargs):
-    """Wrapper of click.style()"""
+@functools.lru_cache
+def is_color_output():
+    """Whether to output with color, according to color_output config"""
 
     color_output = get_config()['color_output']
 
     if color_output == 'always':
-        return click.style(text, *args, **kwargs)
+        return True
     elif color_output == 'auto':
-        if sys.stdout.isatty() and 'TERM' in os.environ:
-            return click.style(text, *args, **kwargs)
-        else:
-            return text
+        return sys.stdout.isatty() and 'TERM' in os.environ
     else: # 'never'
+        return False
+
+
+# same as click.style()
+ANSI_COLORS = {
+    'black': 30,
+    'red': 31,
+    'green': 32,
+    'yellow': 33,
+    'blue': 34,
+    'magenta': 35,
+    'cyan': 36,
+    'white': 37,
+    'reset': 39,
+    'bright_black': 90,
+    'bright_red': 91,
+    'bright_green': 92,
+    'bright_yellow': 93,
+    'bright_blue': 94,
+    'bright_magenta': 95,
+    'bright_cyan': 96,
+    'bright_white': 97,
+}
+
+
+def ansi_style(text, fg=None, bold=None, underline=None, reset=True):
+    """Same output as click.style(), without importing click"""
+
+    bits = []
+    if fg is not None:
+        bits.append(f'\x1b[{ANSI_COLORS[fg]}m')
+    if bold is not None:
+        bits.append(f'\x1b[{1 if bold else 22}m')
+    if underline is not None:
+        bits.append(f'\x1b[{4 if underline else 24}m')
+    bits.append(text)
+    if reset:
+        bits.append('\x1b[0m')
+
+    return ''.join(bits)
+
+
+def style(text, *args, **kwargs):
+    """Wrapper of ansi_style()"""
+
+    if is_color_output():
+        return ansi_style(text, *args, **kwargs)
+    else:
         return text
 
 
@@ -165,327 +454,3326 @@ def get_escape_str(*args, **kwargs):
     return style('', *args, **kwargs)
 
 
+def build_style_table(colors, color):
+    """Escape string of every type.
+    Return: {type: escape_str, }
+    """
+
+    def escape(**kwargs):
+        return ansi_style('', reset=False, **kwargs) if color else ''
+
+    return {
+        None: '',
+        'description': escape(fg=colors['description'], underline=False),
+        'usage': escape(fg=colors['usage'], underline=False),
+        'command': escape(fg=colors['command'], underline=False),
+        'param': escape(fg=colors['param'], underline=True),
+        'reset': ansi_style('') if color else '',
+    }
+
+
+@functools.lru_cache
+def get_style_table():
+    """Escape string of every type, built once from the config"""
+
+    return build_style_table(get_config()['colors'], is_color_output())
+
+
+def build_page_style(config, color):
+    """Everything parse_page() needs from the config"""
+
+    return {
+        'escape': build_style_table(config['colors'], color),
+        'command_indent_size': config['command_indent_size'],
+        'compact_output': config['compact_output'],
+    }
+
+
+@functools.lru_cache
+def get_page_style():
+    return build_page_style(get_config(), is_color_output())
+
+
 @functools.lru_cache
 def get_escape_str_by_type(_type):
     """Get escape string by type"""
 
     assert _type is None or type(_type) == str
 
-    colors = get_config()['colors']
-
-    if _type is None:
-        return ''
-    elif _type in ('description', 'usage', 'command'):
-        return get_escape_str(fg=colors[_type], underline=False)
-    elif _type == 'param':
-        return get_escape_str(fg=colors[_type], underline=True)
-    else:
+    if _type == 'reset' or _type not in get_style_table():
         raise ValueError(f'Unexpected type: {_type!r}')
 
+    return get_style_table()[_type]
 
-def parse_inline_md(line, line_type):
-    """Parse inline markdown syntax"""
 
-    line_list = re.split(r'(`|\{\{|\}\})', line)
-    line_list = [_ for _ in line_list if len(_) > 0]
+# `code`, {{param}}, captured, so re.split() result is: text, token, text, token, ..., text
+INLINE_MD_TOKEN_RE = re.compile(r'(`|\{\{|\}\})')
+
+
+def parse_inline_spans(line, line_type):
+    """Parse inline markdown syntax into spans, one per text between delimiters, even if empty.
+    Return: [(type, text), ], type is None after unbalanced '}}'
+    """
+
     code_started = False
-    result = ''
-    
-    result += get_escape_str_by_type(line_type)
+    spans = []
+    span_type = line_type
     type_stack = [None] * 8 # fail safe, for invalid line like '- abc {def}} ghi'
     type_stack.append(line_type)
-    for item in line_list:
-        if item == '`':
+
+    is_token = False
+    for item in INLINE_MD_TOKEN_RE.split(line):
+        if not is_token:
+            spans.append((span_type, item))
+        elif item == '`':
             if not code_started:
-                result += get_escape_str_by_type('command')
                 type_stack.append('command')
             else:
                 type_stack.pop()
-                result += get_escape_str_by_type(type_stack[-1])
-            
+            span_type = type_stack[-1]
+
             code_started = not code_started
         elif item == '{{':
-            result += get_escape_str_by_type('param')
             type_stack.append('param')
-        elif item == '}}':
+            span_type = 'param'
+        else: # '}}'
             type_stack.pop()
-            result += get_escape_str_by_type(type_stack[-1])
-        else:
-            result += item
-    
-    result += get_escape_str(reset=True)
-    return result
+            span_type = type_stack[-1]
 
+        is_token = not is_token
 
-def parse_page(page_file_path):
-    """Parse the command man page."""
+    return spans
 
-    log = logging.getLogger(__name__)
 
-    compact_output = get_config()['compact_output']
-    command_indent_size = get_config()['command_indent_size']
+def render_inline_spans(spans, escape):
+    """ANSI backend of inline spans, escape is a style table, see build_style_table()"""
 
-    log.debug('Reading file: %r', page_file_path)
-    with open(page_file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines() # with '\n' end
-    
-    output_lines = []
-    for line in lines:
-        line = line.strip('\n')
-        if line.startswith('# '): # h1
-            continue
-        elif line.startswith('> '): # description
-            line = parse_inline_md(line[2:], 'description')
-            output_lines.append(line)
-        elif line.startswith('- '): # usage
-            line = parse_inline_md(line[2:], 'usage')
-            output_lines.append(line)
-        elif line.startswith('`'): # code example
-            line = line.strip('`')
-            line = parse_inline_md(line, 'command')
-            line = (' ' * command_indent_size) + line
-            output_lines.append(line)
-        elif line == '':
-            if not compact_output:
-                # default: reset = True, add reset string at the end
-                output_lines.append(style(line))
-            else:
-                pass
-        else:
-            line = parse_inline_md(line, 'usage')
-            output_lines.append(line)
-    
-    output_lines.append(style('')) # gap new line + fail safe reset
-    return output_lines
+    return ''.join([escape[span_type] + text for span_type, text in spans]) + escape['reset']
 
 
-@functools.lru_cache
-def get_index(repo_directory):
-    """Generate index in the pages directory.
-    Return: [(platform, command), ]
-    """
+def parse_inline_md(line, line_type, escape=None):
+    """Parse inline markdown syntax, escape is a style table, see build_style_table()"""
 
-    assert type(repo_directory) == str
+    if escape is None:
+        escape = get_style_table()
 
-    log = logging.getLogger(__name__)
+    return render_inline_spans(parse_inline_spans(line, line_type), escape)
 
-    index = []
 
-    log.debug('os.walk() in %r', repo_directory)
-    tree_generator = os.walk(repo_directory)
-    platforms = next(tree_generator)[1]
-    
-    for platform in platforms:
-        pages = next(tree_generator)[2]
-        index += [(platform, page[:-3]) for page in pages if page.endswith('.md')] # there is no .MD uppercase
-    
-    return index
+class PageLine:
+    """A line of a page, type is one of 'title', 'description', 'usage', 'command', 'text', 'blank'"""
 
+    __slots__ = ('type', 'spans')
 
-def get_page_path_list(command=None, platform='default'):
-    """Get page_path_list in all repo"""
+    def __init__(self, line_type, spans):
+        self.type = line_type
+        self.spans = spans # [(type, text), ], see parse_inline_spans()
 
-    assert command is None or type(command) == str
-    assert type(platform) == str
+    def get_text(self):
+        return ''.join([text for _, text in self.spans])
 
-    repo_directory_list = get_config()['repo_directory_list']
-    default_platform_set = set(get_config()['platform_list'])
 
-    page_path_list = []
-    for repo_directory in repo_directory_list:
-        index = get_index(repo_directory)
+class Page:
+    """A parsed page, all lines in order, so every backend renders from it alone"""
 
-        if command is not None:
-            filter_func = lambda entry: entry[1] == command
-            index = filter(filter_func, index)
-        
-        if platform == 'all':
-            pass
-        elif platform == 'default':
-            index = filter(lambda entry: entry[0] in default_platform_set, index)
-        else:
-            index = filter(lambda entry: entry[0] == platform, index)
+    __slots__ = ('title', 'lines')
 
-        page_path_list += [os.path.join(repo_directory, entry[0], entry[1] + '.md') for entry in index]
-    
-    return page_path_list
+    def __init__(self, title, lines):
+        self.title = title
+        self.lines = lines # [PageLine, ]
 
+    def get_description(self):
+        return [line for line in self.lines if line.type == 'description']
 
-def action_init():
-    """Interactively gererate config file"""
+    def get_examples(self):
+        """Return: [(usage PageLine or None, command PageLine or None), ]"""
 
-    log = logging.getLogger(__name__)
+        examples = []
+        for line in self.lines:
+            if line.type == 'usage':
+                examples.append([line, None])
+            elif line.type == 'command':
+                if len(examples) > 0 and examples[-1][1] is None:
+                    examples[-1][1] = line
+                else:
+                    examples.append([None, line])
 
-    config_path = get_config_path()
-    if os.path.exists(config_path):
-        log.warning("A config file already exists: %r", config_path)
-        if click.prompt('Are you sure want to overwrite it? (yes/no)', default='no') != 'yes':
-            return
-    
-    repo_path_list = []
-    log.info('Please input repo path line by line, to "pages/" level, empty line to end.')
-    while True:
-        repo_path = click.prompt("Input 1 tldr repo path", default='')
-        if len(repo_path) == 0:
-            break
-        repo_path = os.path.abspath(os.path.expanduser(repo_path))
-        if not os.path.exists(repo_path):
-            log.error("Repo path not exist, clone it first.")
-        elif repo_path not in repo_path_list:
-            repo_path_list.append(repo_path)
+        return [tuple(_) for _ in examples]
 
-    platform_list = []
-    platform_choice = click.Choice(('common', 'linux', 'osx', 'sunos', 'windows'))
-    log.info('Please input default platforms line by line, empty line to end.')
-    while True:
-        platform = click.prompt("Input 1 platform", type=platform_choice, default='')
-        if len(platform) == 0:
-            break
-        elif platform not in platform_list:
-            platform_list.append(platform)
+    def to_dict(self):
+        """For --format json, spans of empty text are dropped"""
 
-    log.info('Please input colors, empty to use default.')
-    colors_choice = click.Choice(('black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white', 'bright_black', 'bright_red', 'bright_green', 'bright_yellow', 'bright_blue', 'bright_magenta', 'bright_cyan', 'bright_white'))
-    colors = {
-        "description": click.prompt('Input color for description', type=colors_choice, default='bright_yellow'),
-        "usage": click.prompt('Input color for usage', type=colors_choice, default='green'),
-        "command": click.prompt('Input color for command', type=colors_choice, default='white'),
-        "param": click.prompt('Input color for param', type=colors_choice, default='cyan'),
-    }
+        def line_to_dict(line):
+            if line is None:
+                return None
+            return {'text': line.get_text(), 'spans': [[span_type, text] for span_type, text in line.spans if text != '']}
 
-    color_output_choice = click.Choice(('always', 'auto', 'never'))
-    color_output = click.prompt('When output with color?', type=color_output_choice, default='auto')
+        return {
+            'title': self.title,
+            'description': [line_to_dict(_) for _ in self.get_description()],
+            'examples': [{'description': line_to_dict(usage), 'command': line_to_dict(command)} for usage, command in self.get_examples()],
+        }
 
-    command_indent_size = click.prompt('Command indent size?', type=int, default=4)
-    if command_indent_size < 0:
-        command_indent_size = 0
 
-    compact_output = click.prompt('Enable compact output (not output empty lines)? (yes/no)', default='no') == 'yes'
+class PagePack:
+    """Read-only pages of many repo compiled into one file, see action_compile_pack().
 
-    config = {
-        'repo_directory_list': repo_path_list,
-        'color_output': color_output,
-        'colors': colors,
-        'command_indent_size': command_indent_size,
-        'platform_list': platform_list,
-        'compact_output': compact_output,
-    }
+    Layout: header, meta json, table of records sorted by command, command names, page bodies.
+    A record is (name_offset, name_size, repo_index, platform_index, reserved, body_offset, body_size).
+    """
 
-    config_dir_path = get_config_dir_path()
-    if not os.path.exists(config_dir_path):
-        log.info('Make dir: %r', config_dir_path)
-        os.makedirs(config_dir_path)
+    def __init__(self, pack_path):
+        import mmap
+        import json
+        import struct
+
+        self.pack_path = pack_path
+        with open(pack_path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mm[:len(PACK_MAGIC)] != PACK_MAGIC:
+            raise ValueError(f'Not a tldr page pack: {pack_path!r}')
+
+        header = struct.unpack_from(PACK_HEADER_FORMAT, self.mm, 0)
+        _, version, self.entry_count, meta_offset, meta_size, self.table_offset, self.names_offset, self.bodies_offset = header
+        if version != PACK_VERSION:
+            raise ValueError(f'Unsupported tldr page pack version {version}: {pack_path!r}')
+
+        meta = json.loads(self.mm[meta_offset:meta_offset + meta_size].decode('utf-8'))
+        self.repos = meta['repos']
+        self.platforms = meta['platforms']
+        self.record_struct = struct.Struct(PACK_RECORD_FORMAT)
+        self.view = memoryview(self.mm)
+
+    def get_record(self, i):
+        return self.record_struct.unpack_from(self.mm, self.table_offset + i * self.record_struct.size)
+
+    def get_name(self, record):
+        name_offset = self.names_offset + record[0]
+        return self.mm[name_offset:name_offset + record[1]]
+
+    def find(self, command):
+        """Binary search, return records of a command"""
+
+        name = command.encode('utf-8')
+        low, high = 0, self.entry_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_name(self.get_record(middle)) < name:
+                low = middle + 1
+            else:
+                high = middle
 
-    log.info("Write to config file %r", config_path)
-    with open(config_path, 'w') as f:
-        f.write(json.dumps(config, ensure_ascii=True, indent=4))
+        record_list = []
+        while low < self.entry_count:
+            record = self.get_record(low)
+            if self.get_name(record) != name:
+                break
+            record_list.append(record)
+            low += 1
 
+        return record_list
 
-def action_update():
-    """Update all tldr pages repo."""
+    def get_body(self, repo_index, platform, command):
+        """Slice of the page bytes, without copy, None if not found"""
 
-    log = logging.getLogger(__name__)
+        for record in self.find(command):
+            if record[2] == repo_index and self.platforms[record[3]] == platform:
+                body_offset = self.bodies_offset + record[5]
+                return self.view[body_offset:body_offset + record[6]]
 
-    repo_directory_list = get_config()['repo_directory_list']
-    command = ['git', 'pull', '--stat']
-    command_str = ' '.join(command)
+        return None
 
-    for repo_directory in repo_directory_list:
-        os.chdir(repo_directory)
-        log.info("Check for updates in %r ...", repo_directory)
-        try:
-            return_code = subprocess.call(command)
-            return_code_color = 'green' if return_code == 0 else 'bright_red'
-            return_code_str = style(str(return_code), fg=return_code_color)
+    def get_index(self, repo_index):
+        """Return: [(platform, command), ]"""
 
-            log.info('Command %r return code %s', command_str, return_code_str)
-        except Exception as e:
-            log.error('Error when run %r in %r: %r %r', command_str, repo_directory, type(e), e)
+        index = []
+        for i in range(self.entry_count):
+            record = self.get_record(i)
+            if record[2] == repo_index:
+                index.append((self.platforms[record[3]], self.get_name(record).decode('utf-8')))
 
+        return index
 
-def action_find(command, platform):
-    """Find and display the tldr pages of a command."""
 
-    assert type(command) == str
-    assert platform is None or type(platform) == str
+@functools.lru_cache
+def open_pack(pack_path):
+    return PagePack(pack_path)
 
-    log = logging.getLogger(__name__)
 
-    if platform:
-        page_path_list = get_page_path_list(command, platform)
-    else:
-        page_path_list = get_page_path_list(command, 'default')
-    
-    if len(page_path_list) == 0:
-        log.error("Command not found: %r", command)
-        log.error("You can try to find a page on all platforms by run %r.", f'tldr -p all {command}')
-        log.error("If still nothing, you can create a new issue against the tldr-pages/tldr GitHub repository: %r,", f'https://github.com/tldr-pages/tldr/issues/new?title=page%20request:%20{command}')
-        log.error("or create a Pull Request on GitHub.")
-        sys.exit(1)
-    else:
-        for page_path in page_path_list:
-            print(style(command, underline=True, bold=True) + ' - ' + style(page_path, underline=True, bold=True))
-            output_lines = parse_page(page_path)
-            for line in output_lines:
-                print(line)
+def is_pack_path(path):
+    return path.endswith(PACK_SUFFIX) and os.path.isfile(path)
 
 
-def action_list_command(command, platform):
-    """Locate all tldr page files path of the command."""
-    
-    assert command is None or type(command) == str
-    assert platform is None or type(platform) == str
+def split_pack_path(path):
+    """Split a path in a page pack, e.g. '/a/b.tldrpack/0/common/tar.md' -> ('/a/b.tldrpack', ['0', 'common', 'tar.md'])
+    Return: None if not in a pack
+    """
 
-    if platform:
-        page_path_list = get_page_path_list(command, platform)
-    else:
-        page_path_list = get_page_path_list(command, 'all')
-    
-    for page_path in page_path_list:
-        print(page_path)
+    i = path.find(PACK_SUFFIX + os.sep)
+    if i < 0:
+        return None
 
+    pack_path = path[:i + len(PACK_SUFFIX)]
+    if not os.path.isfile(pack_path):
+        return None
 
-def action_version():
-    print(f'{__title__}, by {__author__}, version {__version__}')
-    print(f'Homepage: {__homepage__}')
-    print(__specification__)
+    return pack_path, path[i + len(PACK_SUFFIX) + 1:].split(os.sep)
 
 
-def parse_args(args=sys.argv[1:]):
-    log = logging.getLogger(__name__)
+class ZipPages:
+    """Read-only pages in a zip archive, e.g. the official tldr.zip, without extracting it.
 
-    parser = argparse.ArgumentParser(
-        description='Yet another python client for tldr-pages/tldr. View tldr pages in multi repo, multi platform, any language at the same time.',
-        epilog='https://github.com/Phuker/multi-tldr',
-        add_help=True
-    )
-    group = parser.add_mutually_exclusive_group(required=False)
-    group.add_argument('-i', '--init', action="store_true", help="Interactively gererate config file")
-    group.add_argument('-l', '--list', action='store_true', help="Print all tldr page files path (of a command if specified) in all repo on all/specified platform")
-    group.add_argument('-u', '--update', action="store_true", help="Pull all git repo")
-    
-    parser.add_argument('command', help="Command to query", nargs='*')
-    parser.add_argument('-p', '--platform', help="Specify platform. Special virtual platform options are 'all' and 'default'", choices=['common', 'linux', 'osx', 'sunos', 'windows', 'all', 'default'])
+    The member table is built from the central directory only, and cached across runs by save_members().
+    A member is read at its local header offset and decompressed on demand.
+    """
 
-    parser.add_argument('-v', '--version', action="store_true", help="Show version and exit")
+    def __init__(self, zip_path):
+        import hashlib
 
-    args = parser.parse_args(args)
+        self.zip_path = zip_path
+        stat_result = os.stat(zip_path)
+        self.mtime_ns = stat_result.st_mtime_ns
+        self.top_dir_set = None
+        self.stamp = [stat_result.st_mtime_ns, stat_result.st_size]
 
-    if len(args.command) > 0:
-        args.command = '-'.join(args.command)
-    else:
-        args.command = None
+        self.cache_name = os.path.join('zip', hashlib.sha1(zip_path.encode('utf-8')).hexdigest() + '.json')
+        cache = load_cache(self.cache_name, ZIP_INDEX_VERSION)
+        if type(cache) == dict and cache.get('path') == zip_path and cache.get('stamp') == self.stamp:
+            self.members = cache['members']
+            self.saved = True
+        else:
+            self.members = self.read_central_directory()
+            self.saved = False
 
-    ctrl_group_set = args.init or args.list or args.update
-    ok_conditions = [
-        args.version,
-        args.init and args.command is None and args.platform is None,
-        args.list,
-        args.update and args.command is None and args.platform is None,
-        not ctrl_group_set and args.command is not None,
-    ]
+    def save_members(self):
+        """Save the member table to the persistent cache, if read from the central directory"""
 
-    if not any(ok_conditions):
+        if not self.saved:
+            save_cache(self.cache_name, ZIP_INDEX_VERSION, {'path': self.zip_path, 'stamp': self.stamp, 'members': self.members})
+            self.saved = True
+
+    def read_central_directory(self):
+        """Return: {name: [header_offset, compress_type, compress_size, file_size], }"""
+
+        import zipfile
+
+        log = logging.getLogger(__name__)
+
+        log.debug('Reading zip central directory: %r', self.zip_path)
+        members = {}
+        with zipfile.ZipFile(self.zip_path) as zip_file:
+            for info in zip_file.infolist():
+                if info.is_dir() or info.flag_bits & 0x1: # encrypted
+                    continue
+                members[info.filename] = [info.header_offset, info.compress_type, info.compress_size, info.file_size]
+
+        return members
+
+    def get_top_dir_set(self):
+        """Names of top level dirs, e.g. {'pages', 'pages.zh'}"""
+
+        if self.top_dir_set is None:
+            self.top_dir_set = set([_.split('/', 1)[0] for _ in self.members if '/' in _])
+
+        return self.top_dir_set
+
+    def get_size(self, name):
+        """Uncompressed size of a member, None if not found"""
+
+        member = self.members.get(name)
+        return None if member is None else member[3]
+
+    def read(self, name):
+        """Decompress a member, None if not found"""
+
+        import zlib
+        import struct
+
+        member = self.members.get(name)
+        if member is None:
+            return None
+
+        header_offset, compress_type, compress_size, _ = member
+        with open(self.zip_path, 'rb') as f:
+            f.seek(header_offset)
+            signature, name_size, extra_size = struct.unpack(ZIP_LOCAL_HEADER_FORMAT, f.read(struct.calcsize(ZIP_LOCAL_HEADER_FORMAT)))
+            if signature != ZIP_LOCAL_HEADER_SIGNATURE:
+                raise ValueError(f'Bad zip local header of {name!r} in {self.zip_path!r}')
+            f.seek(name_size + extra_size, os.SEEK_CUR)
+            data = f.read(compress_size)
+
+        if compress_type == ZIP_STORED:
+            return data
+        elif compress_type == ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        else:
+            raise ValueError(f'Unsupported zip compression method {compress_type} of {name!r} in {self.zip_path!r}')
+
+    def get_index(self, prefix):
+        """Pages in a dir of the archive, prefix is '' or ends with '/'.
+        Return: [(platform, command), ]
+        """
+
+        index = []
+        for name in self.members:
+            if not name.startswith(prefix) or not name.endswith('.md'):
+                continue
+            part_list = name[len(prefix):].split('/')
+            if len(part_list) == 2:
+                index.append((part_list[0], part_list[1][:-3]))
+
+        return index
+
+
+@functools.lru_cache
+def open_zip(zip_path):
+    """Shared by the process, like open_pack(), nothing is written until save_members()"""
+
+    return ZipPages(zip_path)
+
+
+def is_zip_path(path):
+    return path.endswith(ZIP_SUFFIX) and os.path.isfile(path)
+
+
+def split_zip_path(path):
+    """Split a path in a zip archive, e.g. '/a/tldr.zip/pages/common/tar.md' -> ('/a/tldr.zip', 'pages/common/tar.md')
+    Return: None if not in a zip archive
+    """
+
+    i = path.find(ZIP_SUFFIX)
+    while i >= 0:
+        end = i + len(ZIP_SUFFIX)
+        if end == len(path) or path[end] == os.sep:
+            zip_path = path[:end]
+            if os.path.isfile(zip_path):
+                return zip_path, path[end + 1:].replace(os.sep, '/')
+        i = path.find(ZIP_SUFFIX, end)
+
+    return None
+
+
+def get_repo_directory_list():
+    config = get_config()
+    return expand_repo_directory_list(config['repo_directory_list'], get_language_list(config.get('language_list')))
+
+
+def get_language_list(config_language_list=None):
+    """Languages in priority order, language_list in config, or from LANGUAGE and LANG environment variables, 'en' is the last fallback.
+    e.g. LANG=zh_CN.UTF-8 -> ['zh_CN', 'zh', 'en']
+    """
+
+    if config_language_list is not None:
+        language_list = list(config_language_list)
+    else:
+        language_list = []
+        locale_list = os.environ.get('LANGUAGE', '').split(':') + [os.environ.get('LANG', '')]
+        for locale_name in locale_list:
+            locale_name = locale_name.split('.', 1)[0].split('@', 1)[0] # e.g. 'zh_CN.UTF-8', 'sr_RS@latin'
+            if locale_name in ('', 'C', 'POSIX'):
+                continue
+            language_list += [locale_name, locale_name.split('_', 1)[0]]
+
+    return list(dict.fromkeys(language_list + ['en']))
+
+
+def get_language_directory_name(language):
+    return 'pages' if language == 'en' else f'pages.{language}'
+
+
+def get_language_directory_list(repo_directory, language_list):
+    """Language dirs of a repo root like a clone of tldr-pages/tldr, found by one scandir(), in language priority order.
+    Return: [path, ], None if not a repo root
+    """
+
+    try:
+        with os.scandir(repo_directory) as it:
+            name_set = set([entry.name for entry in it if (entry.name == 'pages' or entry.name.startswith('pages.')) and entry.is_dir()])
+    except OSError:
+        return None
+
+    if len(name_set) == 0:
+        return None
+
+    name_list = [get_language_directory_name(_) for _ in language_list]
+    return [os.path.join(repo_directory, _) for _ in name_list if _ in name_set]
+
+
+def select_language_page_path_list(page_path_list, config_repo_directory_list):
+    """Pages of a command ordered by repo, keep only the first language dir of each repo root in config which has the command,
+    e.g. '/a/tldr/pages/linux/du.md' is dropped if '/a/tldr/pages.zh/linux/du.md' or '/a/tldr/pages.zh/common/du.md' is before it.
+    A language dir in config itself is always kept, see expand_repo_directory_list().
+    """
+
+    root_set = set([os.path.normpath(_) for _ in config_repo_directory_list])
+    language_directory_map = {} # {repo root: the language dir chosen}
+    result = []
+    for page_path in page_path_list:
+        repo_directory = os.path.dirname(os.path.dirname(page_path))
+        root, name = os.path.split(repo_directory)
+        if (name == 'pages' or name.startswith('pages.')) and root in root_set and os.path.normpath(repo_directory) not in root_set:
+            if language_directory_map.setdefault(root, repo_directory) != repo_directory:
+                continue
+        result.append(page_path)
+
+    return result
+
+
+def expand_repo_directory_list(config_repo_directory_list, language_list=('en',), persistent=True):
+    """repo_directory_list in config, a page pack is expanded to a virtual dir of each repo in it, e.g. '/a/b.tldrpack/0',
+    a repo root or a zip archive with 'pages' or 'pages.xx' dirs is expanded to them in language_list order, e.g. '/a/tldr.zip/pages'.
+    The member table of a zip archive is saved to the persistent cache if persistent.
+    """
+
+    repo_directory_list = []
+    for repo_directory in config_repo_directory_list:
+        if is_pack_path(repo_directory):
+            pack = open_pack(repo_directory)
+            repo_directory_list += [os.path.join(repo_directory, str(i)) for i in range(len(pack.repos))]
+        elif is_zip_path(repo_directory):
+            zip_pages = open_zip(repo_directory)
+            if persistent:
+                zip_pages.save_members()
+            name_list = [get_language_directory_name(_) for _ in language_list]
+            language_directory_list = [os.path.join(repo_directory, _) for _ in name_list if _ in zip_pages.get_top_dir_set()]
+            repo_directory_list += language_directory_list or [repo_directory]
+        else:
+            language_directory_list = get_language_directory_list(repo_directory, language_list)
+            repo_directory_list += [repo_directory] if language_directory_list is None else language_directory_list
+
+    return repo_directory_list
+
+
+def get_pack_page(page_path):
+    """Return: (pack, repo_index, platform, command), None if not a page in a pack"""
+
+    split_result = split_pack_path(page_path)
+    if split_result is None:
+        return None
+
+    pack_path, part_list = split_result
+    if len(part_list) != 3 or not part_list[0].isdigit() or not part_list[2].endswith('.md'):
+        return None
+
+    return open_pack(pack_path), int(part_list[0]), part_list[1], part_list[2][:-3]
+
+
+def get_zip_page(page_path):
+    """Return: (zip_pages, name), None if not in a zip archive"""
+
+    split_result = split_zip_path(page_path)
+    if split_result is None:
+        return None
+
+    return open_zip(split_result[0]), split_result[1]
+
+
+def page_exists(page_path):
+    if TRACER is not None:
+        TRACER.count('stat')
+
+    zip_page = get_zip_page(page_path)
+    if zip_page is not None:
+        return zip_page[0].get_size(zip_page[1]) is not None
+
+    pack_page = get_pack_page(page_path)
+    if pack_page is None:
+        return os.path.isfile(page_path)
+
+    pack, repo_index, platform, command = pack_page
+    return pack.get_body(repo_index, platform, command) is not None
+
+
+def stat_page(page_path):
+    """Return: (mtime_ns, size), a page in a pack or a zip archive has the mtime of it"""
+
+    if TRACER is not None:
+        TRACER.count('stat')
+
+    zip_page = get_zip_page(page_path)
+    if zip_page is not None:
+        zip_pages, name = zip_page
+        size = zip_pages.get_size(name)
+        if size is None:
+            raise FileNotFoundError(page_path)
+
+        return zip_pages.mtime_ns, size
+
+    pack_page = get_pack_page(page_path)
+    if pack_page is None:
+        stat_result = os.stat(page_path)
+        return stat_result.st_mtime_ns, stat_result.st_size
+
+    pack, repo_index, platform, command = pack_page
+    body = pack.get_body(repo_index, platform, command)
+    if body is None:
+        raise FileNotFoundError(page_path)
+
+    return os.stat(pack.pack_path).st_mtime_ns, len(body)
+
+
+def read_page_bytes(page_path):
+    zip_page = get_zip_page(page_path)
+    if zip_page is not None:
+        body = zip_page[0].read(zip_page[1])
+        if body is None:
+            raise FileNotFoundError(page_path)
+
+        return body
+
+    pack_page = get_pack_page(page_path)
+    if pack_page is None:
+        with open(page_path, 'rb') as f:
+            return f.read()
+
+    pack, repo_index, platform, command = pack_page
+    body = pack.get_body(repo_index, platform, command)
+    if body is None:
+        raise FileNotFoundError(page_path)
+
+    return body
+
+
+def open_page(page_path):
+    """Open a page in text mode, same as open() for a normal file"""
+
+    import io
+
+    if get_pack_page(page_path) is None and get_zip_page(page_path) is None:
+        return open(page_path, 'r', encoding='utf-8')
+
+    return io.TextIOWrapper(io.BytesIO(read_page_bytes(page_path)), encoding='utf-8')
+
+
+@trace_phase('parse')
+def read_page(page_file_path):
+    """Parse the command man page.
+    Return: Page
+    """
+
+    log = logging.getLogger(__name__)
+
+    log.debug('Reading file: %r', page_file_path)
+    if TRACER is not None:
+        TRACER.count('page_read')
+
+    title = None
+    page_lines = []
+    with open_page(page_file_path) as f:
+        for line in f: # streamed, with '\n' end
+            if TRACER is not None:
+                TRACER.count('page_read_bytes', len(line.encode('utf-8')))
+            page_lines.append(parse_page_line(line.strip('\n')))
+            if title is None and page_lines[-1].type == 'title':
+                title = page_lines[-1].spans[0][1]
+
+    return Page(title, page_lines)
+
+
+def parse_page_line(line):
+    """Parse a line of a page, without the newline.
+    Return: PageLine
+    """
+
+    if line.startswith('# '): # h1
+        return PageLine('title', [('title', line[2:])])
+    elif line.startswith('> '): # description
+        return PageLine('description', parse_inline_spans(line[2:], 'description'))
+    elif line.startswith('- '): # usage
+        return PageLine('usage', parse_inline_spans(line[2:], 'usage'))
+    elif line.startswith('`'): # code example
+        return PageLine('command', parse_inline_spans(line.strip('`'), 'command'))
+    elif line == '':
+        return PageLine('blank', [])
+    else:
+        return PageLine('text', parse_inline_spans(line, 'usage'))
+
+
+def iter_page_lines(page, page_style):
+    """ANSI backend of a Page, with page_style of build_page_style(), yield rendered lines without the newline"""
+
+    escape = page_style['escape']
+    compact_output = page_style['compact_output']
+    command_indent = ' ' * page_style['command_indent_size']
+
+    for line in page.lines:
+        if line.type == 'title':
+            continue
+        elif line.type == 'command':
+            yield command_indent + render_inline_spans(line.spans, escape)
+        elif line.type == 'blank':
+            if not compact_output:
+                yield escape['reset']
+        else:
+            yield render_inline_spans(line.spans, escape)
+
+    yield escape['reset'] # gap new line + fail safe reset
+
+
+def parse_page(page_file_path, page_style=None):
+    """Parse the command man page, with page_style of build_page_style(), or of the config.
+    Return: [rendered line, ]
+    """
+
+    if page_style is None:
+        page_style = get_page_style()
+
+    return list(iter_page_lines(read_page(page_file_path), page_style))
+
+
+def render_page(page_file_path, page_style=None, page=None):
+    """Render a page to bytes, as written to stdout, from page if parsed already"""
+
+    if page_style is None:
+        page_style = get_page_style()
+    if page is None:
+        page = read_page(page_file_path)
+
+    return ''.join([line + '\n' for line in iter_page_lines(page, page_style)]).encode('utf-8')
+
+
+def render_page_html(page):
+    """HTML backend of a Page, `code` as <code>, {{param}} as <var>"""
+
+    import html
+
+    output_lines = []
+    for line in page.lines:
+        tag_map = {'param': 'var'} if line.type == 'command' else {'command': 'code', 'param': 'var'}
+        inner = ''.join([
+            f'<{tag_map[span_type]}>{html.escape(text)}</{tag_map[span_type]}>' if span_type in tag_map else html.escape(text)
+            for span_type, text in line.spans if text != ''
+        ])
+        if line.type == 'title':
+            output_lines.append(f'<h1>{inner}</h1>')
+        elif line.type == 'command':
+            output_lines.append(f'<pre><code>{inner}</code></pre>')
+        elif line.type != 'blank':
+            output_lines.append(f'<p class="{line.type}">{inner}</p>')
+
+    return ''.join([line + '\n' for line in output_lines])
+
+
+@trace_phase('index.walk')
+def build_index(repo_directory):
+    """Walk the pages directory.
+    Return: {platform: [command, ], }
+    """
+
+    assert type(repo_directory) == str
+
+    log = logging.getLogger(__name__)
+
+    index = {}
+
+    log.debug('os.walk() in %r', repo_directory)
+    tree_generator = os.walk(repo_directory)
+    top = next(tree_generator, None)
+    if top is None: # removed or not readable
+        log.warning('Can not read pages directory: %r', repo_directory)
+        return index
+
+    platforms = top[1]
+
+    for platform in platforms:
+        pages = next(tree_generator)[2]
+        index[platform] = [page[:-3] for page in pages if page.endswith('.md')] # there is no .MD uppercase
+
+    return index
+
+
+def get_index_stamp(repo_directory, platforms):
+    """Get mtime of repo and platform dirs, any page added, removed or renamed changes it"""
+
+    if TRACER is not None:
+        TRACER.count('stat', len(platforms) + 1)
+
+    stamp = {}
+    split_result = split_pack_path(repo_directory) or split_zip_path(repo_directory)
+    if split_result is not None:
+        return {'': os.stat(split_result[0]).st_mtime_ns}
+
+    try:
+        stamp[''] = os.stat(repo_directory).st_mtime_ns
+        for platform in platforms:
+            stamp[platform] = os.stat(os.path.join(repo_directory, platform)).st_mtime_ns
+    except OSError:
+        return None
+
+    return stamp
+
+
+def compute_style_hash(config, color):
+    """Hash of all configs which affect rendered output"""
+
+    import json
+    import hashlib
+
+    style_config = {
+        'version': RENDER_CACHE_VERSION,
+        'color': color,
+        'colors': config['colors'],
+        'command_indent_size': config['command_indent_size'],
+        'compact_output': config['compact_output'],
+    }
+    style_config_str = json.dumps(style_config, sort_keys=True)
+
+    return hashlib.sha1(style_config_str.encode('utf-8')).hexdigest()
+
+
+@functools.lru_cache
+def get_style_hash():
+    return compute_style_hash(get_config(), is_color_output())
+
+
+def get_render_cache_path(page_file_path, style_hash=None):
+    """Get render cache file path of a page, None if cache disabled or page not found"""
+
+    if 'TLDR_NO_CACHE' in os.environ:
+        return None
+
+    page_file_path = os.path.abspath(page_file_path)
+    try:
+        mtime_ns, size = stat_page(page_file_path)
+    except OSError:
+        return None
+
+    return get_render_cache_path_by_stat(page_file_path, mtime_ns, size, style_hash)
+
+
+def get_render_cache_path_by_stat(page_file_path, mtime_ns, size, style_hash=None):
+    """Same as get_render_cache_path(), for a page at the time of the stat, which may be changed or removed now"""
+
+    import hashlib
+
+    page_file_path = os.path.abspath(page_file_path)
+    key = f'{page_file_path}\0{mtime_ns}\0{size}\0{style_hash or get_style_hash()}'
+    key_hash = hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    return os.path.join(get_cache_dir_path(), 'render', key_hash)
+
+
+def evict_render_cache(render_cache_dir_path, max_size):
+    """Remove least recently used rendered pages until total size <= max_size"""
+
+    log = logging.getLogger(__name__)
+
+    entry_list = []
+    total_size = 0
+    for entry in os.scandir(render_cache_dir_path):
+        if entry.name.startswith('.'): # being written by another process
+            continue
+
+        try:
+            stat_result = entry.stat()
+        except FileNotFoundError: # removed by another process
+            continue
+
+        entry_list.append((stat_result.st_mtime_ns, stat_result.st_size, entry.path))
+        total_size += stat_result.st_size
+
+    if total_size <= max_size:
+        return
+
+    entry_list.sort()
+    for _, size, path in entry_list:
+        if total_size <= max_size:
+            break
+
+        log.debug('Evict render cache: %r', path)
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+@trace_phase('render')
+def get_rendered_page(page_file_path):
+    """Get rendered page in bytes, from the render cache if possible"""
+
+    return get_client().render_bytes(page_file_path)
+
+
+def read_render_cache(page_file_path, cache_path):
+    """Return: rendered page in bytes, None if not cached"""
+
+    log = logging.getLogger(__name__)
+
+    try:
+        with open(cache_path, 'rb') as f:
+            data = f.read()
+
+        log.debug('Render cache hit: %r', page_file_path)
+        if TRACER is not None:
+            TRACER.count('render_cache_hit')
+            TRACER.count('render_cache_read_bytes', len(data))
+        try:
+            os.utime(cache_path) # mtime is the last used time, for LRU eviction
+        except OSError:
+            pass
+
+        return data
+    except FileNotFoundError:
+        pass
+
+    if TRACER is not None:
+        TRACER.count('render_cache_miss')
+
+    return None
+
+
+def write_render_cache(cache_path, data):
+    log = logging.getLogger(__name__)
+
+    try:
+        write_file_atomic(cache_path, data)
+        evict_render_cache(os.path.dirname(cache_path), RENDER_CACHE_MAX_SIZE)
+    except Exception as e:
+        log.debug('Error when write render cache %r: %r %r', cache_path, type(e), e)
+
+
+@trace_phase('write')
+def write_stdout_bytes(data, flush_text=True):
+    """Write bytes to stdout directly, skip the text layer, flush what is written to the text layer before if flush_text"""
+
+    if TRACER is not None:
+        TRACER.count('write_bytes', len(data))
+
+    if flush_text:
+        sys.stdout.flush()
+    if hasattr(sys.stdout, 'buffer'):
+        sys.stdout.buffer.write(data)
+    else:
+        sys.stdout.write(data.decode('utf-8'))
+
+
+@functools.lru_cache
+def get_prerender_directory():
+    """prerender_directory in config, None if not set, or rendered with another style config"""
+
+    import json
+
+    log = logging.getLogger(__name__)
+
+    prerender_directory = get_config().get('prerender_directory')
+    if prerender_directory is None:
+        return None
+
+    try:
+        with open(os.path.join(prerender_directory, 'stamp.json'), 'r', encoding='utf-8') as f:
+            stamp = json.load(f)
+    except Exception as e:
+        log.debug('Ignore prerender dir %r: %r %r', prerender_directory, type(e), e)
+        return None
+
+    if stamp != {'version': PRERENDER_VERSION, 'style_hash': get_style_hash()}:
+        log.debug('Ignore stale prerender dir %r', prerender_directory)
+        return None
+
+    return prerender_directory
+
+
+def get_prerender_key(page_file_path):
+    """Changes with the page, raise OSError if page not found"""
+
+    import hashlib
+
+    page_file_path = os.path.abspath(page_file_path)
+    mtime_ns, size = stat_page(page_file_path)
+    key = f'{page_file_path}\0{mtime_ns}\0{size}'
+
+    return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def get_prerendered_page_path(page_file_path):
+    """Get the prerendered file of a page, None if not prerendered or changed since then"""
+
+    prerender_directory = get_prerender_directory()
+    if prerender_directory is None:
+        return None
+
+    try:
+        key = get_prerender_key(page_file_path)
+    except OSError:
+        return None
+
+    prerendered_page_path = os.path.join(prerender_directory, 'pages', key[:2], key)
+    if not os.path.isfile(prerendered_page_path):
+        return None
+
+    logging.getLogger(__name__).debug('Prerendered page hit: %r', page_file_path)
+    if TRACER is not None:
+        TRACER.count('prerender_hit')
+    return prerendered_page_path
+
+
+def prerender_pages(pages_directory, page_path_list):
+    """Render pages into the pages dir of a prerender dir, run in a worker process of action_prerender()"""
+
+    for page_path in page_path_list:
+        key = get_prerender_key(page_path)
+        write_file_atomic(os.path.join(pages_directory, key[:2], key), render_page(page_path))
+
+    return len(page_path_list)
+
+
+@functools.lru_cache
+def get_index_cache():
+    """Persistent index of all repo, {repo_directory: {'stamp': {}, 'pages': {}}, }"""
+
+    cache = load_cache('index.json', INDEX_CACHE_VERSION)
+    if type(cache) != dict:
+        cache = {}
+
+    return cache
+
+
+INDEX_CACHE_LOCK = threading.Lock() # guards the persistent index, shared by all TldrClient
+
+
+@functools.lru_cache
+def get_index(repo_directory):
+    """Generate index in the pages directory, use the persistent index if not changed.
+    Return: [(platform, command), ]
+    """
+
+    return load_index(repo_directory)
+
+
+@trace_phase('index')
+def load_index(repo_directory, persistent=True):
+    """Same as get_index(), without the in-memory cache, without the persistent index if not persistent"""
+
+    assert type(repo_directory) == str
+
+    log = logging.getLogger(__name__)
+
+    split_result = split_pack_path(repo_directory)
+    if split_result is not None:
+        pack_path, part_list = split_result
+        return open_pack(pack_path).get_index(int(part_list[0]))
+
+    split_result = split_zip_path(repo_directory)
+    if split_result is not None:
+        zip_path, name = split_result
+        zip_pages = open_zip(zip_path)
+        if persistent:
+            zip_pages.save_members()
+        return zip_pages.get_index(name + '/' if name else '')
+
+    if not persistent:
+        pages = build_index(repo_directory)
+        return [(platform, command) for platform, commands in pages.items() for command in commands]
+
+    with INDEX_CACHE_LOCK:
+        index_cache = get_index_cache()
+        entry = index_cache.get(repo_directory)
+        if entry is not None and entry['stamp'] == get_index_stamp(repo_directory, entry['pages'].keys()):
+            log.debug('Index cache hit: %r', repo_directory)
+            if TRACER is not None:
+                TRACER.count('index_cache_hit')
+            pages = entry['pages']
+            return [(platform, command) for platform, commands in pages.items() for command in commands]
+
+    # walk without the lock, other repos are not blocked
+    if TRACER is not None:
+        TRACER.count('index_cache_miss')
+    pages = build_index(repo_directory)
+    stamp = get_index_stamp(repo_directory, pages.keys())
+
+    with INDEX_CACHE_LOCK:
+        index_cache[repo_directory] = {
+            'stamp': stamp,
+            'pages': pages,
+        }
+        save_cache('index.json', INDEX_CACHE_VERSION, index_cache)
+
+    return [(platform, command) for platform, commands in pages.items() for command in commands]
+
+
+@functools.lru_cache
+def get_page_hash_cache():
+    """Persistent content hashes of pages, {repo_directory: {'platform/command': [mtime_ns, size, sha1, normalized sha1], }, },
+    apart from the index, which is loaded by every run
+    """
+
+    cache = load_cache('hashes.json', PAGE_HASH_CACHE_VERSION)
+    if type(cache) != dict:
+        cache = {}
+
+    return cache
+
+
+PAGE_HASH_CACHE_LOCK = threading.Lock()
+
+
+def get_page_hash_list(page_path_list):
+    """Content hashes of pages, kept in hashes.json, a page is read only if changed since hashed.
+    The normalized hash ignores case and whitespace, for near-duplicates.
+    Return: [(sha1, normalized sha1), ]
+    """
+
+    import hashlib
+
+    repo_directory_map = {os.path.normpath(_): _ for _ in get_repo_directory_list()}
+
+    hash_list = []
+    changed = False
+    with PAGE_HASH_CACHE_LOCK:
+        hash_cache = get_page_hash_cache()
+        for page_path in page_path_list:
+            platform_path, filename = os.path.split(page_path)
+            repo_path, platform = os.path.split(platform_path)
+            repo_directory = repo_directory_map.get(os.path.normpath(repo_path))
+            persistent = repo_directory is not None and split_pack_path(repo_directory) is None and split_zip_path(repo_directory) is None
+            hashes = hash_cache.setdefault(repo_directory, {}) if persistent else {} # a pack or a zip archive is hashed on the fly
+            key = f'{platform}/{filename[:-3]}'
+
+            try:
+                stat = list(stat_page(page_path))
+                item = hashes.get(key)
+                if item is None or item[:2] != stat:
+                    if TRACER is not None:
+                        TRACER.count('page_hash')
+                    data = bytes(read_page_bytes(page_path))
+                    normalized_data = ' '.join(data.decode('utf-8', 'replace').lower().split()).encode('utf-8')
+                    item = stat + [hashlib.sha1(data).hexdigest(), hashlib.sha1(normalized_data).hexdigest()]
+                    hashes[key] = item
+                    changed = changed or persistent
+            except OSError: # removed just now, never the same as another page
+                item = [None, None, page_path, page_path]
+
+            hash_list.append((item[2], item[3]))
+
+        if changed:
+            save_cache('hashes.json', PAGE_HASH_CACHE_VERSION, hash_cache)
+
+    return hash_list
+
+
+def group_same_pages(page_path_list):
+    """Group byte-identical pages, in the order of the first page of each group.
+    Return: [(page_path_list, path of a nearly the same page before it or None), ]
+    """
+
+    group_map = {} # {sha1: group}
+    normalized_map = {} # {normalized sha1: the first page path}
+    group_list = []
+    for page_path, (content_hash, normalized_hash) in zip(page_path_list, get_page_hash_list(page_path_list)):
+        group = group_map.get(content_hash)
+        if group is not None:
+            group[0].append(page_path)
+            continue
+
+        group = ([page_path], normalized_map.get(normalized_hash))
+        group_map[content_hash] = group
+        normalized_map.setdefault(normalized_hash, page_path)
+        group_list.append(group)
+
+    return group_list
+
+
+def is_stamp_list_current(repo_directory_list, stamps):
+    """Check stamps saved by get_repo_stamp() without building any index, a None stamp is always stale"""
+
+    return all([stamp is not None and get_index_stamp(repo_directory, [_ for _ in stamp if _ != '']) == stamp for repo_directory, stamp in zip(repo_directory_list, stamps)])
+
+
+def get_repo_stamp(repo_directory):
+    """Index stamp of a repo, checked by the last get_index()"""
+
+    entry = get_index_cache().get(repo_directory)
+    if entry is None: # a repo in a pack is not in the persistent index
+        return get_index_stamp(repo_directory, [])
+
+    return entry['stamp']
+
+
+class CommandIndex:
+    """All pages in all repo, command -> platform bitmask, built from the index of each repo, see get_index().
+
+    Bit (repo_index * len(platforms) + platform_index) of a mask is set if <repo>/<platform>/<command>.md exists.
+    Commands are interned and sorted for prefix scans, commands of each <repo>/<platform> dir are kept for listing.
+    """
+
+    def __init__(self, repo_directory_list, index_list=None):
+        import bisect
+
+        self.bisect = bisect
+        self.repo_directory_list = repo_directory_list
+        if index_list is None:
+            index_list = [get_index(repo_directory) for repo_directory in repo_directory_list]
+
+        self.platforms = sorted(set([platform for index in index_list for platform, _ in index]))
+        self.platform_ids = {platform: i for i, platform in enumerate(self.platforms)}
+        self.width = len(self.platforms)
+
+        self.masks = {}
+        self.dir_commands = [[] for _ in range(len(repo_directory_list) * self.width)]
+        for repo_index, index in enumerate(index_list):
+            for platform, command in index:
+                command = sys.intern(command)
+                bit = repo_index * self.width + self.platform_ids[platform]
+                self.masks[command] = self.masks.get(command, 0) | (1 << bit)
+                self.dir_commands[bit].append(command)
+
+        self.commands = sorted(self.masks)
+        for command_list in self.dir_commands:
+            command_list.sort()
+
+    def get_platform_id_list(self, platform_list):
+        """None for all platforms, unknown platforms are skipped"""
+
+        if platform_list is None:
+            return list(range(self.width))
+
+        return [self.platform_ids[_] for _ in dict.fromkeys(platform_list) if _ in self.platform_ids]
+
+    def get_page_path_list(self, command, platform_list=None):
+        """Pages of a command, ordered by repo, then by platform_list"""
+
+        mask = self.masks.get(command, 0)
+        if mask == 0:
+            return []
+
+        platform_id_list = self.get_platform_id_list(platform_list)
+        page_path_list = []
+        for repo_index, repo_directory in enumerate(self.repo_directory_list):
+            repo_mask = mask >> (repo_index * self.width)
+            for platform_id in platform_id_list:
+                if repo_mask >> platform_id & 1:
+                    page_path_list.append(os.path.join(repo_directory, self.platforms[platform_id], command + '.md'))
+
+        return page_path_list
+
+    def list_page_path(self, platform_list=None):
+        """All pages on platforms, ordered by repo, platform, then command"""
+
+        platform_id_list = self.get_platform_id_list(platform_list)
+        page_path_list = []
+        for repo_index, repo_directory in enumerate(self.repo_directory_list):
+            for platform_id in platform_id_list:
+                dir_path = os.path.join(repo_directory, self.platforms[platform_id]) + os.sep # same as os.path.join() per page, much faster
+                page_path_list += [dir_path + command + '.md' for command in self.dir_commands[repo_index * self.width + platform_id]]
+
+        return page_path_list
+
+    def get_commands_by_prefix(self, prefix):
+        """Sorted commands start with prefix"""
+
+        start = self.bisect.bisect_left(self.commands, prefix)
+        end = start
+        while end < len(self.commands) and self.commands[end].startswith(prefix):
+            end += 1
+
+        return self.commands[start:end]
+
+
+def get_command_index():
+    return get_client().get_command_index()
+
+
+def get_pattern_prefix(glob=None, regex=None):
+    """Literal prefix of all command names matched by glob and regex, '' if unknown, e.g. 'git-*' -> 'git-', '^git-c' -> 'git-c'"""
+
+    prefix_list = ['']
+    if glob is not None:
+        prefix_list.append(re.match(r'[^*?[]*', glob).group())
+
+    if regex is not None and '|' not in regex:
+        match = re.match(r'\^([\w-]*)', regex)
+        if match is not None:
+            prefix = match.group(1)
+            if regex[match.end():match.end() + 1] in ('?', '*', '{'): # the last char is optional
+                prefix = prefix[:-1]
+            prefix_list.append(prefix)
+
+    return max(prefix_list, key=len) # both must match, the longer is also a prefix
+
+
+def is_page_name(name):
+    """Whether name is a valid name of a platform dir or a command, which does not escape from the repo"""
+
+    return name != '' and os.sep not in name and not (os.altsep and os.altsep in name) and not name.startswith('.') and '\0' not in name
+
+
+def probe_page_path_list(repo_directory_list, platform_list, command):
+    """stat() <repo>/<platform>/<command>.md directly, O(repos * platforms)"""
+
+    if not is_page_name(command):
+        return []
+
+    platform_list = [_ for _ in dict.fromkeys(platform_list) if is_page_name(_)] # unique, keep order
+    page_path_list = []
+    for repo_directory in repo_directory_list:
+        for platform in platform_list:
+            page_path = os.path.join(repo_directory, platform, command + '.md')
+            if page_exists(page_path):
+                page_path_list.append(page_path)
+
+    return page_path_list
+
+
+class TldrClient:
+    """Embeddable tldr, safe to share between threads, never prints or exits.
+
+    Owns a validated copy of the config, the index of each repo, the command index, bounded LRU of parsed and rendered pages.
+    Nothing is read from disk until needed, and never with the lock held, a cold index build does not block other threads.
+    refresh() drops the index of changed repos, invalidate() drops everything.
+    The persistent caches under the config dir are used only if persistent, like the CLI does, nothing is written there otherwise.
+    Opened page packs and zip archives are read-only and shared by the process, refresh() drops them if changed.
+    Search and suggestions are not part of a client, see search_pages() and suggest_commands().
+    """
+
+    def __init__(self, config=None, color=None, persistent=False, render_cache_size=RENDER_MEMORY_CACHE_SIZE):
+        """config: dict like tldr.config.json, None to read the config file, ValueError if bad.
+        color: bool, None for color_output == 'always'
+        """
+
+        self.lock = threading.RLock()
+        self.generation = 0 # changes when anything is dropped, a result built without the lock is kept only if not changed
+        self.persistent = persistent
+        self.render_cache_size = render_cache_size
+        self.reload(config, color)
+
+    def reload(self, config=None, color=None):
+        """Replace the config, drop all caches"""
+
+        import copy
+
+        if config is None:
+            config = self.read_config_file()
+        try:
+            check_config(config)
+            if color is None:
+                color = config['color_output'] == 'always'
+        except (AssertionError, KeyError, TypeError) as e: # a missing key, or a value of a bad type
+            raise ValueError(f'Bad config: {e!r}') from e
+        config = copy.deepcopy(config)
+
+        with self.lock:
+            self.config = config
+            self.color = bool(color)
+            self.page_style = build_page_style(config, self.color)
+            self.style_hash = compute_style_hash(config, self.color)
+            self.invalidate()
+
+    @staticmethod
+    def read_config_file():
+        import json
+
+        config_path = get_config_path()
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except OSError as e:
+            raise ValueError(f'Can not read config file {config_path!r}: {e}') from e
+        except ValueError as e:
+            raise ValueError(f'Bad config file {config_path!r}: {e}') from e
+
+    def invalidate(self):
+        """Drop all indexes and rendered pages"""
+
+        import collections
+
+        with self.lock:
+            self.generation += 1
+            self.repo_directory_list = None
+            self.index_map = {} # {repo_directory: (stamp, index)}
+            self.command_index = None
+            self.render_cache = collections.OrderedDict() # {(page_path, mtime_ns, size): data}
+            self.page_cache = collections.OrderedDict() # {(page_path, mtime_ns, size): Page}
+
+    def refresh(self):
+        """Drop the index of every repo with pages added, removed or renamed since it was built.
+        Return: whether anything is dropped
+        """
+
+        log = logging.getLogger(__name__)
+
+        with self.lock:
+            repo_directory_list = self.repo_directory_list
+            entry_list = list(self.index_map.items())
+
+        if repo_directory_list is not None and repo_directory_list != self.expand_repo_directory_list():
+            log.debug('Language dirs changed')
+            self.invalidate()
+            return True
+
+        stale_list = []
+        for repo_directory, (stamp, index) in entry_list:
+            platforms = set([platform for platform, _ in index])
+            if get_index_stamp(repo_directory, platforms) != stamp:
+                stale_list.append(repo_directory)
+
+        if len(stale_list) == 0:
+            return False
+
+        with self.lock:
+            for repo_directory in stale_list:
+                log.debug('Repo changed: %r', repo_directory)
+                self.index_map.pop(repo_directory, None)
+            self.command_index = None
+            self.generation += 1
+
+        if any([split_pack_path(_) or split_zip_path(_) for _ in stale_list]): # reopen, the file is replaced
+            open_pack.cache_clear()
+            open_zip.cache_clear()
+
+        return True
+
+    def expand_repo_directory_list(self):
+        return expand_repo_directory_list(self.config['repo_directory_list'], get_language_list(self.config.get('language_list')), self.persistent)
+
+    def get_repo_directory_list(self):
+        with self.lock:
+            if self.repo_directory_list is not None:
+                return self.repo_directory_list
+            generation = self.generation
+
+        repo_directory_list = self.expand_repo_directory_list()
+        with self.lock:
+            if self.generation == generation and self.repo_directory_list is None:
+                self.repo_directory_list = repo_directory_list
+
+        return repo_directory_list
+
+    def get_stamp_list(self):
+        """Index stamp of each repo, changes if pages are added, removed or renamed, after refresh()"""
+
+        return [self.get_index_entry(repo_directory)[0] for repo_directory in self.get_repo_directory_list()]
+
+    def get_index_entry(self, repo_directory):
+        """Return: (stamp, [(platform, command), ])"""
+
+        with self.lock:
+            entry = self.index_map.get(repo_directory)
+            generation = self.generation
+
+        if entry is None:
+            # without the lock, 2 threads may build the same index, the first one is kept
+            index = load_index(repo_directory, self.persistent)
+            platforms = set([platform for platform, _ in index])
+            entry = (get_index_stamp(repo_directory, platforms), index)
+            with self.lock:
+                if self.generation == generation:
+                    entry = self.index_map.setdefault(repo_directory, entry)
+
+        return entry
+
+    def get_index(self, repo_directory):
+        """Return: [(platform, command), ]"""
+
+        return self.get_index_entry(repo_directory)[1]
+
+    def get_command_index(self):
+        with self.lock:
+            if self.command_index is not None:
+                return self.command_index
+            generation = self.generation
+
+        repo_directory_list = self.get_repo_directory_list()
+        index_list = [self.get_index(repo_directory) for repo_directory in repo_directory_list]
+        command_index = CommandIndex(repo_directory_list, index_list)
+        with self.lock:
+            if self.generation == generation and self.command_index is None:
+                self.command_index = command_index
+
+        return command_index
+
+    def get_platform_list(self, platform):
+        """None for 'all', ValueError if not a valid platform name"""
+
+        assert type(platform) == str
+
+        if platform == 'all':
+            return None
+        elif platform == 'default':
+            return self.config['platform_list']
+        elif not is_page_name(platform):
+            raise ValueError(f'Bad platform: {platform!r}')
+        else:
+            return [platform]
+
+    def list_pages(self, command=None, platform='default'):
+        """Get page paths of a command, or of all commands if command is None"""
+
+        assert command is None or type(command) == str
+
+        platform_list = self.get_platform_list(platform)
+        if command is not None and platform_list is not None:
+            # fast path, no need to build the index of any repo
+            return select_language_page_path_list(probe_page_path_list(self.get_repo_directory_list(), platform_list, command), self.config['repo_directory_list'])
+
+        command_index = self.get_command_index()
+        if command is not None:
+            return select_language_page_path_list(command_index.get_page_path_list(command, platform_list), self.config['repo_directory_list'])
+
+        return command_index.list_page_path(platform_list)
+
+    def iter_pages(self, command=None, platform='all', glob=None, regex=None, unique=False):
+        """Yield page paths repo by repo, without building the list of all pages.
+        glob and regex are matched against command names, unique skips a platform/command already yielded from a former repo.
+        """
+
+        import fnmatch
+
+        assert command is None or type(command) == str
+
+        platform_list = self.get_platform_list(platform)
+        platform_set = set(platform_list) if platform_list is not None else None
+        pattern = re.compile(regex) if regex is not None else None
+        seen_set = set()
+
+        def is_matched(entry_command):
+            if glob is not None and not fnmatch.fnmatchcase(entry_command, glob):
+                return False
+            if pattern is not None and pattern.search(entry_command) is None:
+                return False
+            return True
+
+        def is_seen(entry_platform, entry_command):
+            if unique:
+                key = (entry_platform, entry_command)
+                if key in seen_set:
+                    return True
+                seen_set.add(key)
+            return False
+
+        if command is not None:
+            if not is_matched(command):
+                return
+
+            for page_path in self.list_pages(command, platform):
+                if not is_seen(os.path.basename(os.path.dirname(page_path)), command):
+                    yield page_path
+            return
+
+        prefix = get_pattern_prefix(glob, regex)
+        if prefix != '':
+            # a literal prefix, only commands in a range of the sorted command index
+            command_index = self.get_command_index()
+            command_list = [_ for _ in command_index.get_commands_by_prefix(prefix) if is_matched(_)]
+            platform_id_list = command_index.get_platform_id_list(platform_list)
+            for repo_index, repo_directory in enumerate(command_index.repo_directory_list):
+                for entry_command in command_list:
+                    repo_mask = command_index.masks[entry_command] >> (repo_index * command_index.width)
+                    for platform_id in platform_id_list:
+                        entry_platform = command_index.platforms[platform_id]
+                        if repo_mask >> platform_id & 1 and not is_seen(entry_platform, entry_command):
+                            yield os.path.join(repo_directory, entry_platform, entry_command + '.md')
+            return
+
+        for repo_directory in self.get_repo_directory_list():
+            for entry_platform, entry_command in self.get_index(repo_directory):
+                if platform_set is not None and entry_platform not in platform_set:
+                    continue
+                if not is_matched(entry_command) or is_seen(entry_platform, entry_command):
+                    continue
+
+                yield os.path.join(repo_directory, entry_platform, entry_command + '.md')
+
+    def list_pages_of(self, command_list, platform='default'):
+        """Get page paths of many commands, only these commands are looked up.
+        Return: {command: [page_path, ]}, a command not found is missing
+        """
+
+        assert type(command_list) == list
+
+        platform_list = self.get_platform_list(platform)
+        command_list = list(dict.fromkeys(command_list))
+        if platform_list is not None and len(command_list) <= BATCH_PROBE_MAX_COMMANDS:
+            repo_directory_list = self.get_repo_directory_list()
+            page_path_map = {command: probe_page_path_list(repo_directory_list, platform_list, command) for command in command_list}
+        else:
+            command_index = self.get_command_index()
+            page_path_map = {command: command_index.get_page_path_list(command, platform_list) for command in command_list}
+
+        return {command: select_language_page_path_list(page_path_list, self.config['repo_directory_list']) for command, page_path_list in page_path_map.items() if len(page_path_list) > 0}
+
+    def find(self, command, platform='default', render=True):
+        """Look up the pages of a command.
+        Return: [{'command': str, 'platform': str, 'repo_directory': str, 'page_path': str, 'text': str or None}, ]
+        """
+
+        assert type(command) == str
+
+        result = []
+        for page_path in self.list_pages(command, platform):
+            repo_directory, platform_name = os.path.split(os.path.dirname(page_path))
+            result.append({
+                'command': command,
+                'platform': platform_name,
+                'repo_directory': repo_directory,
+                'page_path': page_path,
+                'text': self.render(page_path) if render else None,
+            })
+
+        return result
+
+    def complete(self, prefix, platform='default'):
+        """Names of commands start with prefix, on the platforms.
+        If persistent, a cold run reads complete.json only, see get_complete_index()
+        """
+
+        import bisect
+
+        assert type(prefix) == str
+
+        platform_list = self.get_platform_list(platform)
+        if self.persistent:
+            complete_index = get_complete_index(self)
+            names = complete_index['names']
+            masks = complete_index['masks']
+            platform_mask = sum([1 << i for i, _ in enumerate(complete_index['platforms']) if platform_list is None or _ in platform_list])
+
+            result = []
+            i = bisect.bisect_left(names, prefix)
+            while i < len(names) and names[i].startswith(prefix):
+                if masks[i] & platform_mask:
+                    result.append(names[i])
+                i += 1
+
+            return result
+
+        command_index = self.get_command_index()
+        platform_id_list = command_index.get_platform_id_list(platform_list)
+        repo_mask = sum([1 << _ for _ in platform_id_list])
+        platform_mask = 0
+        for repo_index in range(len(command_index.repo_directory_list)):
+            platform_mask |= repo_mask << (repo_index * command_index.width)
+
+        return [_ for _ in command_index.get_commands_by_prefix(prefix) if command_index.masks[_] & platform_mask]
+
+    def get_page(self, page_path):
+        """Parsed page, see read_page(). OSError if not found"""
+
+        mtime_ns, size = stat_page(page_path)
+        key = (os.path.abspath(page_path), mtime_ns, size)
+        with self.lock:
+            page = self.page_cache.get(key)
+            if page is not None:
+                self.page_cache.move_to_end(key)
+                return page
+
+        page = read_page(page_path)
+        with self.lock:
+            self.page_cache[key] = page
+            while len(self.page_cache) > self.render_cache_size:
+                self.page_cache.popitem(last=False)
+
+        return page
+
+    def render_bytes(self, page_path):
+        """Rendered page in bytes, as written to stdout. OSError if not found"""
+
+        try:
+            mtime_ns, size = stat_page(page_path)
+        except OSError:
+            return render_page(page_path, self.page_style) # raises
+
+        key = (os.path.abspath(page_path), mtime_ns, size)
+        with self.lock:
+            data = self.render_cache.get(key)
+            if data is not None:
+                self.render_cache.move_to_end(key)
+                return data
+
+        cache_path = get_render_cache_path(page_path, self.style_hash) if self.persistent else None
+        data = read_render_cache(page_path, cache_path) if cache_path is not None else None
+        if data is None:
+            data = render_page(page_path, self.page_style, self.get_page(page_path))
+            if cache_path is not None:
+                write_render_cache(cache_path, data)
+
+        with self.lock:
+            self.render_cache[key] = data
+            while len(self.render_cache) > self.render_cache_size:
+                self.render_cache.popitem(last=False)
+
+        return data
+
+    def render(self, page_path):
+        return self.render_bytes(page_path).decode('utf-8')
+
+
+@functools.lru_cache
+def get_client():
+    """The TldrClient of the CLI, with the config file and the persistent caches"""
+
+    return TldrClient(get_config(), color=is_color_output(), persistent=True)
+
+
+@trace_phase('lookup')
+def get_page_path_list(command=None, platform='default'):
+    """Get page_path_list in all repo"""
+
+    return get_client().list_pages(command, platform)
+
+
+def iter_page_path(command=None, platform='all', glob=None, regex=None, unique=False):
+    """Yield page paths repo by repo, see TldrClient.iter_pages()"""
+
+    return get_client().iter_pages(command, platform, glob, regex, unique)
+
+
+def stem_word(word):
+    """Very light suffix stripping, so 'compresses', 'compressed' and 'compress' are the same term"""
+
+    if len(word) <= 3 or not word.isalpha():
+        return word
+
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-3] + 'i'
+    elif word.endswith('s') and not word.endswith('ss') and not word.endswith('us'):
+        word = word[:-1]
+
+    if word.endswith('ing') and len(word) > 5:
+        word = word[:-3]
+    elif word.endswith('ed') and len(word) > 4:
+        word = word[:-2]
+
+    if word.endswith('y') and len(word) > 3:
+        word = word[:-1] + 'i'
+
+    return word
+
+
+def get_search_terms(text):
+    """Split text into normalized search terms, stop words removed"""
+
+    return [
+        stem_word(word) for word in SEARCH_WORD_RE.findall(text.lower())
+        if word not in SEARCH_STOP_WORDS
+    ]
+
+
+def get_page_search_doc(page_file_path, command):
+    """Tokenize a page for the search index.
+    Return: {'mtime': int, 'size': int, 'length': int, 'description': str, 'terms': {term: tf, }}
+    """
+
+    mtime_ns, size = stat_page(page_file_path)
+    with open_page(page_file_path) as f:
+        lines = f.readlines()
+
+    # command name matters most
+    term_list = get_search_terms(command.replace('-', ' ')) * 3
+    description_list = []
+    for line in lines:
+        line = line.strip('\n')
+        if line.startswith('# '): # h1, same as command name
+            continue
+        elif line.startswith('> '):
+            line = line[2:]
+            description_list.append(INLINE_MD_TOKEN_RE.sub('', line))
+        elif line.startswith('- '):
+            line = line[2:]
+
+        term_list += get_search_terms(INLINE_MD_TOKEN_RE.sub(' ', line))
+
+    terms = {}
+    for term in term_list:
+        terms[term] = terms.get(term, 0) + 1
+
+    return {
+        'mtime': mtime_ns,
+        'size': size,
+        'length': len(term_list),
+        'description': description_list[0] if description_list else '',
+        'terms': terms,
+    }
+
+
+def get_search_shard_id(term):
+    import zlib
+
+    return zlib.crc32(term.encode('utf-8')) % SEARCH_INDEX_SHARD_COUNT
+
+
+def build_search_index():
+    """Update the persistent search index, only re-tokenize pages changed.
+    Return: search index meta, see get_search_index()
+    """
+
+    import time
+
+    log = logging.getLogger(__name__)
+
+    repo_directory_list = get_repo_directory_list()
+
+    # forward index: {repo_directory: {'stamp': {}, 'docs': {'platform/command': doc, }}, }
+    forward_index = load_cache('search/forward.json', SEARCH_INDEX_VERSION)
+    if type(forward_index) != dict:
+        forward_index = {}
+
+    new_forward_index = {}
+    for repo_directory in repo_directory_list:
+        index = get_index(repo_directory)
+        stamp = get_repo_stamp(repo_directory)
+        old_entry = forward_index.get(repo_directory, {'stamp': None, 'docs': {}})
+        if stamp is not None and old_entry['stamp'] == stamp: # None if the repo is not readable
+            new_forward_index[repo_directory] = old_entry
+            continue
+
+        log.debug('Update search index of %r', repo_directory)
+        old_docs = old_entry['docs']
+        docs = {}
+        for platform, command in index:
+            key = f'{platform}/{command}'
+            page_path = os.path.join(repo_directory, platform, command + '.md')
+            old_doc = old_docs.get(key)
+            if old_doc is not None:
+                if [old_doc['mtime'], old_doc['size']] == list(stat_page(page_path)):
+                    docs[key] = old_doc
+                    continue
+
+            docs[key] = get_page_search_doc(page_path, command)
+
+        new_forward_index[repo_directory] = {'stamp': stamp, 'docs': docs}
+
+    save_cache('search/forward.json', SEARCH_INDEX_VERSION, new_forward_index)
+
+    # inverted index, split into shards, a query only loads shards of its terms
+    # a posting has what scoring needs, the doc table is split too, only read for the results
+    doc_list = [] # [[repo_index, platform, command, description], ]
+    platform_ids = {}
+    shard_list = [{} for _ in range(SEARCH_INDEX_SHARD_COUNT)] # [{term: [[doc_id, tf, length, platform_id], ]}, ]
+    total_length = 0
+    for repo_index, repo_directory in enumerate(repo_directory_list):
+        for key, doc in sorted(new_forward_index[repo_directory]['docs'].items()):
+            platform, command = key.split('/', 1)
+            platform_id = platform_ids.setdefault(platform, len(platform_ids))
+            doc_id = len(doc_list)
+            doc_list.append([repo_index, platform, command, doc['description']])
+            total_length += doc['length']
+            for term, tf in doc['terms'].items():
+                shard_list[get_search_shard_id(term)].setdefault(term, []).append([doc_id, tf, doc['length'], platform_id])
+
+    doc_shard_list = [doc_list[i:i + SEARCH_DOC_SHARD_SIZE] for i in range(0, len(doc_list), SEARCH_DOC_SHARD_SIZE)]
+    generation = f'{time.time_ns():x}.{os.getpid()}'
+    for shard_id, shard in enumerate(shard_list):
+        save_cache(f'search/postings.{generation}.{shard_id}.json', SEARCH_INDEX_VERSION, shard)
+    for shard_id, doc_shard in enumerate(doc_shard_list):
+        save_cache(f'search/docs.{generation}.{shard_id}.json', SEARCH_INDEX_VERSION, doc_shard)
+
+    meta = {
+        'repo_directory_list': repo_directory_list,
+        'stamps': [new_forward_index[_]['stamp'] for _ in repo_directory_list],
+        'generation': generation,
+        'platforms': list(platform_ids),
+        'doc_count': len(doc_list),
+        'average_length': total_length / len(doc_list) if doc_list else 0.0,
+    }
+    save_cache('search/meta.json', SEARCH_INDEX_VERSION, meta)
+
+    # remove shards of old generations, readers of them will rebuild
+    search_dir_path = os.path.join(get_cache_dir_path(), 'search')
+    if os.path.isdir(search_dir_path):
+        for name in os.listdir(search_dir_path):
+            if name.startswith(('postings.', 'docs.')) and not name.split('.', 1)[1].startswith(f'{generation}.'):
+                try:
+                    os.unlink(os.path.join(search_dir_path, name))
+                except FileNotFoundError:
+                    pass
+
+    meta['shards'] = shard_list # in memory only
+    meta['doc_shards'] = doc_shard_list
+    return meta
+
+
+@functools.lru_cache
+def get_search_index():
+    """Get the search index meta, rebuild it if any repo changed.
+    Return: {'repo_directory_list': [], 'stamps': [], 'generation': str, 'platforms': [], 'doc_count': int, 'average_length': float}
+    """
+
+    repo_directory_list = get_repo_directory_list()
+    meta = load_cache('search/meta.json', SEARCH_INDEX_VERSION)
+    if type(meta) == dict and meta['repo_directory_list'] == repo_directory_list:
+        for repo_directory, stamp in zip(repo_directory_list, meta['stamps']):
+            if type(stamp) != dict or stamp != get_index_stamp(repo_directory, [_ for _ in stamp.keys() if _ != '']):
+                break
+        else:
+            return meta
+
+    return build_search_index()
+
+
+def get_search_shard(meta, shard_id):
+    """Get {term: [[doc_id, tf, length, platform_id], ]} of a shard, None if removed by a newer build"""
+
+    if 'shards' in meta:
+        return meta['shards'][shard_id]
+
+    return load_cache(f'search/postings.{meta["generation"]}.{shard_id}.json', SEARCH_INDEX_VERSION)
+
+
+def get_search_docs(meta, doc_id_list):
+    """Get {doc_id: [repo_index, platform, command, description]}, only doc shards of doc_id_list are loaded, None if removed by a newer build"""
+
+    doc_map = {}
+    for shard_id in sorted(set([_ // SEARCH_DOC_SHARD_SIZE for _ in doc_id_list])):
+        if 'doc_shards' in meta:
+            doc_shard = meta['doc_shards'][shard_id]
+        else:
+            doc_shard = load_cache(f'search/docs.{meta["generation"]}.{shard_id}.json', SEARCH_INDEX_VERSION)
+            if doc_shard is None:
+                return None
+        for i, doc in enumerate(doc_shard):
+            doc_map[shard_id * SEARCH_DOC_SHARD_SIZE + i] = doc
+
+    return {_: doc_map[_] for _ in doc_id_list}
+
+
+def rank_search_results(meta, term_list, platform_set, limit):
+    """BM25 ranking, see search_pages(), None if any shard is removed by a newer build"""
+
+    import math
+
+    shard_id_set = set([get_search_shard_id(term) for term in term_list])
+    shard_dict = {shard_id: get_search_shard(meta, shard_id) for shard_id in shard_id_set}
+    if None in shard_dict.values():
+        return None
+
+    platform_id_set = None if platform_set is None else set([i for i, _ in enumerate(meta['platforms']) if _ in platform_set])
+    doc_count = meta['doc_count']
+    k1, b = 1.2, 0.75
+    scores = {}
+    for term in term_list:
+        posting_list = shard_dict[get_search_shard_id(term)].get(term, [])
+        idf = math.log(1 + (doc_count - len(posting_list) + 0.5) / (len(posting_list) + 0.5))
+        for doc_id, tf, length, platform_id in posting_list:
+            if platform_id_set is not None and platform_id not in platform_id_set:
+                continue
+            length_norm = 1 - b + b * length / meta['average_length']
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + k1 * length_norm)
+
+    # only the top docs, and the ones tied with the last of them, are ranked by command name
+    doc_id_list = sorted(scores, key=lambda doc_id: -scores[doc_id])
+    if len(doc_id_list) > limit:
+        last_score = scores[doc_id_list[limit - 1]] if limit > 0 else math.inf
+        doc_id_list = [_ for _ in doc_id_list if scores[_] >= last_score]
+
+    doc_map = get_search_docs(meta, doc_id_list)
+    if doc_map is None:
+        return None
+
+    result_list = []
+    for doc_id in sorted(doc_id_list, key=lambda doc_id: (-scores[doc_id], doc_map[doc_id][2]))[:limit]:
+        repo_index, doc_platform, command, description = doc_map[doc_id]
+        result_list.append({
+            'page_path': os.path.join(meta['repo_directory_list'][repo_index], doc_platform, command + '.md'),
+            'platform': doc_platform,
+            'command': command,
+            'description': description,
+            'score': scores[doc_id],
+        })
+
+    return result_list
+
+
+@trace_phase('search')
+def search_pages(query, platform='all', limit=SEARCH_MAX_RESULTS):
+    """Full text search, ranked by BM25.
+    Return: [{'page_path': str, 'platform': str, 'command': str, 'description': str, 'score': float}, ]
+    """
+
+    assert type(query) == str
+    assert type(platform) == str
+
+    term_list = list(dict.fromkeys(get_search_terms(query)))
+    if platform == 'default':
+        platform_set = set(get_config()['platform_list'])
+    elif platform != 'all':
+        platform_set = {platform}
+    else:
+        platform_set = None
+
+    result_list = rank_search_results(get_search_index(), term_list, platform_set, limit)
+    if result_list is None: # replaced by another process
+        result_list = rank_search_results(build_search_index(), term_list, platform_set, limit)
+
+    return result_list
+
+
+def get_trigrams(name):
+    """Trigrams of a command name, with start and end markers"""
+
+    name = f'^{name}$'
+    return [name[i:i + 3] for i in range(len(name) - 2)]
+
+
+@functools.lru_cache
+def get_suggest_cache():
+    """Persistent trigram index, loaded once, see get_suggest_index()"""
+
+    suggest_index = load_cache('suggest.json', SUGGEST_INDEX_VERSION)
+    if type(suggest_index) != dict:
+        suggest_index = {}
+
+    return suggest_index
+
+
+def get_suggest_index():
+    """Get the trigram index of all command names in all repo, rebuild it if any repo changed.
+    Return: {'repo_directory_list': [], 'stamps': [], 'names': [sorted names], 'trigrams': {trigram: [name_id, ]}}
+    """
+
+    suggest_index = get_suggest_cache()
+    if suggest_index.get('repo_directory_list') == get_repo_directory_list() and is_stamp_list_current(suggest_index['repo_directory_list'], suggest_index['stamps']):
+        return suggest_index
+
+    command_index = get_command_index()
+    repo_directory_list = command_index.repo_directory_list
+    stamps = [get_repo_stamp(repo_directory) for repo_directory in repo_directory_list]
+    names = command_index.commands
+    trigrams = {}
+    for name_id, name in enumerate(names):
+        for trigram in set(get_trigrams(name)):
+            trigrams.setdefault(trigram, []).append(name_id)
+
+    suggest_index.clear()
+    suggest_index.update({
+        'repo_directory_list': repo_directory_list,
+        'stamps': stamps,
+        'names': names,
+        'trigrams': trigrams,
+    })
+    save_cache('suggest.json', SUGGEST_INDEX_VERSION, suggest_index)
+
+    return suggest_index
+
+
+@trace_phase('suggest')
+def suggest_commands(command, limit=SUGGEST_MAX_RESULTS):
+    """Get command names similar to a command which is not found.
+    Return: [name, ]
+    """
+
+    import bisect
+    import difflib
+
+    assert type(command) == str
+
+    suggest_index = get_suggest_index()
+    names = suggest_index['names']
+    query = command.lower().replace(' ', '-').replace('_', '-')
+    result = []
+
+    def add(name):
+        if name != command and name not in result:
+            result.append(name)
+
+    def has_name(name):
+        i = bisect.bisect_left(names, name)
+        return i < len(names) and names[i] == name
+
+    # e.g. 'Git_Commit' -> 'git-commit'
+    if has_name(query):
+        add(query)
+
+    # typos, found by shared trigrams, then ranked by similarity
+    query_trigrams = set(get_trigrams(query))
+    shared_count = {}
+    for trigram in query_trigrams:
+        for name_id in suggest_index['trigrams'].get(trigram, []):
+            shared_count[name_id] = shared_count.get(name_id, 0) + 1
+
+    def dice(name_id):
+        return 2 * shared_count[name_id] / (len(query_trigrams) + len(names[name_id])) # a name has len(name) trigrams
+
+    candidate_list = sorted(shared_count, key=dice, reverse=True)[:SUGGEST_MAX_CANDIDATES]
+    ratio_list = [(difflib.SequenceMatcher(None, query, names[_]).ratio(), names[_]) for _ in candidate_list]
+    ratio_list.sort(key=lambda item: (-item[0], item[1]))
+    for ratio, name in ratio_list:
+        if ratio >= SUGGEST_MIN_RATIO:
+            add(name)
+
+    # e.g. 'git-commit-amend' -> 'git-commit'
+    part_list = query.split('-')
+    for i in range(len(part_list) - 1, 0, -1):
+        prefix = '-'.join(part_list[:i])
+        if has_name(prefix):
+            add(prefix)
+            break
+
+    # e.g. 'docker' -> 'docker-compose'
+    i = bisect.bisect_left(names, query + '-')
+    while i < len(names) and names[i].startswith(query + '-'):
+        add(names[i])
+        i += 1
+
+    return result[:limit]
+
+
+@trace_phase('lookup')
+def get_page_path_map(command_list, platform='default'):
+    """Get page paths of many commands, see TldrClient.list_pages_of().
+    Return: {command: [page_path, ]}
+    """
+
+    return get_client().list_pages_of(command_list, platform)
+
+
+def get_complete_index(client):
+    """Sorted names of all commands in all repo of a client, with a platform bitmask of each, persisted so a cold run reads one file.
+    Return: {'repo_directory_list': [], 'stamps': [], 'platforms': [], 'names': [sorted names], 'masks': [mask, ]}
+    """
+
+    repo_directory_list = client.get_repo_directory_list()
+    complete_index = load_cache('complete.json', COMPLETE_INDEX_VERSION)
+    if type(complete_index) == dict and complete_index['repo_directory_list'] == repo_directory_list and is_stamp_list_current(repo_directory_list, complete_index['stamps']):
+        return complete_index
+
+    command_index = client.get_command_index()
+    all_platform_mask = (1 << command_index.width) - 1
+    masks = []
+    for name in command_index.commands:
+        mask = command_index.masks[name]
+        platform_mask = 0
+        while mask:
+            platform_mask |= mask & all_platform_mask
+            mask >>= command_index.width
+        masks.append(platform_mask)
+
+    complete_index = {
+        'repo_directory_list': repo_directory_list,
+        'stamps': [get_repo_stamp(repo_directory) for repo_directory in repo_directory_list],
+        'platforms': command_index.platforms,
+        'names': command_index.commands,
+        'masks': masks,
+    }
+    save_cache('complete.json', COMPLETE_INDEX_VERSION, complete_index)
+
+    return complete_index
+
+
+@trace_phase('complete')
+def complete_commands(prefix, platform='default'):
+    """Get names of commands start with prefix, for shell completion.
+    Return: [name, ]
+    """
+
+    assert type(prefix) == str
+    assert type(platform) == str
+
+    return get_client().complete(prefix, platform)
+
+
+def action_init():
+    """Interactively gererate config file"""
+
+    import json
+
+    # buggy: https://github.com/pallets/click/issues/665
+    # import readline
+
+    import click
+
+    log = logging.getLogger(__name__)
+
+    config_path = get_config_path()
+    if os.path.exists(config_path):
+        log.warning("A config file already exists: %r", config_path)
+        if click.prompt('Are you sure want to overwrite it? (yes/no)', default='no') != 'yes':
+            return
+    
+    repo_path_list = []
+    log.info('Please input repo path line by line, to "pages/" level, empty line to end.')
+    while True:
+        repo_path = click.prompt("Input 1 tldr repo path", default='')
+        if len(repo_path) == 0:
+            break
+        repo_path = os.path.abspath(os.path.expanduser(repo_path))
+        if not os.path.exists(repo_path) and split_zip_path(repo_path) is None:
+            log.error("Repo path not exist, clone it first.")
+        elif repo_path not in repo_path_list:
+            repo_path_list.append(repo_path)
+
+    platform_list = []
+    platform_choice = click.Choice(('common', 'linux', 'osx', 'sunos', 'windows'))
+    log.info('Please input default platforms line by line, empty line to end.')
+    while True:
+        platform = click.prompt("Input 1 platform", type=platform_choice, default='')
+        if len(platform) == 0:
+            break
+        elif platform not in platform_list:
+            platform_list.append(platform)
+
+    log.info('Please input colors, empty to use default.')
+    colors_choice = click.Choice(('black', 'red', 'green', 'yellow', 'blue', 'magenta', 'cyan', 'white', 'bright_black', 'bright_red', 'bright_green', 'bright_yellow', 'bright_blue', 'bright_magenta', 'bright_cyan', 'bright_white'))
+    colors = {
+        "description": click.prompt('Input color for description', type=colors_choice, default='bright_yellow'),
+        "usage": click.prompt('Input color for usage', type=colors_choice, default='green'),
+        "command": click.prompt('Input color for command', type=colors_choice, default='white'),
+        "param": click.prompt('Input color for param', type=colors_choice, default='cyan'),
+    }
+
+    color_output_choice = click.Choice(('always', 'auto', 'never'))
+    color_output = click.prompt('When output with color?', type=color_output_choice, default='auto')
+
+    command_indent_size = click.prompt('Command indent size?', type=int, default=4)
+    if command_indent_size < 0:
+        command_indent_size = 0
+
+    compact_output = click.prompt('Enable compact output (not output empty lines)? (yes/no)', default='no') == 'yes'
+
+    config = {
+        'repo_directory_list': repo_path_list,
+        'color_output': color_output,
+        'colors': colors,
+        'command_indent_size': command_indent_size,
+        'platform_list': platform_list,
+        'compact_output': compact_output,
+    }
+
+    config_dir_path = get_config_dir_path()
+    if not os.path.exists(config_dir_path):
+        log.info('Make dir: %r', config_dir_path)
+        os.makedirs(config_dir_path)
+
+    log.info("Write to config file %r", config_path)
+    with open(config_path, 'w') as f:
+        f.write(json.dumps(config, ensure_ascii=True, indent=4))
+
+
+def get_repo_label(repo_directory):
+    """Short name of a repo for output, e.g. 'tldr/pages'"""
+
+    repo_directory = os.path.normpath(repo_directory)
+    return os.path.join(os.path.basename(os.path.dirname(repo_directory)), os.path.basename(repo_directory))
+
+
+def update_repo(repo_directory, command, timeout, output_lock):
+    """Run command in repo_directory, print output lines prefixed by the repo.
+    Return: {'repo_directory': str, 'return_code': int or None, 'timeout': bool, 'time_used': float}
+    """
+
+    import subprocess
+    import time
+
+    log = logging.getLogger(__name__)
+
+    command_str = ' '.join(command)
+    prefix = style(f'[{get_repo_label(repo_directory)}]', bold=True) + ' '
+    result = {
+        'repo_directory': repo_directory,
+        'return_code': None,
+        'timeout': False,
+        'time_used': 0.0,
+    }
+
+    time_start = time.monotonic()
+    try:
+        process = subprocess.Popen(
+            command,
+            cwd=repo_directory,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=dict(os.environ, GIT_TERMINAL_PROMPT='0'), # never block on a password prompt
+            start_new_session=(os.name == 'posix'),
+        )
+    except Exception as e:
+        log.error('Error when run %r in %r: %r %r', command_str, repo_directory, type(e), e)
+        return result
+
+    def kill():
+        result['timeout'] = True
+        try:
+            if os.name == 'posix':
+                import signal
+                os.killpg(process.pid, signal.SIGKILL) # with children, e.g. ssh
+            else:
+                process.kill()
+        except ProcessLookupError: # just exited
+            pass
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        for line in process.stdout:
+            line = line.decode('utf-8', errors='replace').rstrip('\r\n')
+            with output_lock:
+                print(prefix + line, flush=True)
+        result['return_code'] = process.wait()
+    finally:
+        timer.cancel()
+        process.stdout.close()
+
+    result['time_used'] = time.monotonic() - time_start
+    return result
+
+
+def run_git(repo_directory, args):
+    """Return: stdout in bytes, None if failed"""
+
+    import subprocess
+
+    log = logging.getLogger(__name__)
+
+    try:
+        return subprocess.run(
+            ['git'] + args,
+            cwd=repo_directory,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=dict(os.environ, GIT_TERMINAL_PROMPT='0'),
+            timeout=UPDATE_TIMEOUT,
+            check=True,
+        ).stdout
+    except Exception as e:
+        log.debug('Error when run git %r in %r: %r %r', args, repo_directory, type(e), e)
+        return None
+
+
+def get_git_head(repo_directory):
+    """Commit id of HEAD, None if not a git repo"""
+
+    output = run_git(repo_directory, ['rev-parse', '--verify', '--quiet', 'HEAD'])
+    if not output:
+        return None
+
+    return output.decode('ascii').strip()
+
+
+def get_git_page_changes(repo_directory, head_before, head_after):
+    """Pages changed between two commits, from `git diff --name-status`, a renamed page is deleted and added.
+    Return: {'added': ['platform/command', ], 'modified': [], 'deleted': []}, None if failed
+    """
+
+    output = run_git(repo_directory, ['diff', '--name-status', '-M', '-z', '--relative', head_before, head_after, '--'])
+    if output is None:
+        return None
+
+    added, modified, deleted = set(), set(), set()
+    field_list = output.decode('utf-8', 'surrogateescape').split('\0')
+    i = 0
+    while i < len(field_list) - 1:
+        status = field_list[i][:1]
+        path_count = 2 if status in ('R', 'C') else 1
+        path_list = field_list[i + 1:i + 1 + path_count]
+        i += 1 + path_count
+
+        key_list = [path[:-3] if path.count('/') == 1 and path.endswith('.md') else None for path in path_list] # <platform>/<command>.md only
+        if status == 'A' or status == 'C':
+            added.add(key_list[-1])
+        elif status == 'M' or status == 'T':
+            modified.add(key_list[0])
+        elif status == 'D':
+            deleted.add(key_list[0])
+        elif status == 'R':
+            deleted.add(key_list[0])
+            added.add(key_list[1])
+
+    for key_set in (added, modified, deleted):
+        key_set.discard(None)
+    modified |= added & deleted # e.g. renamed to each other
+    added -= modified
+    deleted -= modified
+
+    return {'added': sorted(added), 'modified': sorted(modified), 'deleted': sorted(deleted)}
+
+
+def apply_page_changes(repo_directory, changes, index_stamp):
+    """Apply changed pages of a repo to the persistent index, search index and render cache, instead of rebuilding them.
+    index_stamp is of the repo before the change, a cache built at another time is left to rebuild itself.
+    """
+
+    log = logging.getLogger(__name__)
+
+    with INDEX_CACHE_LOCK:
+        index_cache = get_index_cache()
+        entry = index_cache.get(repo_directory)
+        if entry is None or entry['stamp'] != index_stamp:
+            log.debug('Index of %r is outdated, leave it to rebuild', repo_directory)
+            return
+
+        deleted_set = set(changes['deleted'])
+        pages = {platform: [_ for _ in commands if f'{platform}/{_}' not in deleted_set] for platform, commands in entry['pages'].items()}
+        for key in changes['added']:
+            platform, command = key.split('/', 1)
+            command_list = pages.setdefault(platform, [])
+            if command not in command_list:
+                command_list.append(command)
+        pages = {platform: commands for platform, commands in pages.items() if os.path.isdir(os.path.join(repo_directory, platform))}
+
+        stamp = get_index_stamp(repo_directory, pages.keys())
+        index_cache[repo_directory] = {'stamp': stamp, 'pages': pages}
+        save_cache('index.json', INDEX_CACHE_VERSION, index_cache)
+
+    with PAGE_HASH_CACHE_LOCK:
+        hashes = get_page_hash_cache().get(repo_directory, {})
+        changed_key_list = [_ for _ in changes['deleted'] + changes['modified'] if _ in hashes]
+        for key in changed_key_list:
+            del hashes[key]
+        if len(changed_key_list) > 0:
+            save_cache('hashes.json', PAGE_HASH_CACHE_VERSION, get_page_hash_cache())
+
+    forward_index = load_cache('search/forward.json', SEARCH_INDEX_VERSION)
+    search_entry = forward_index.get(repo_directory) if type(forward_index) == dict else None
+    if search_entry is not None and search_entry['stamp'] == index_stamp:
+        docs = search_entry['docs']
+        for key in changes['deleted'] + changes['modified']:
+            old_doc = docs.pop(key, None)
+            if old_doc is not None: # the rendered page is stale too
+                platform, command = key.split('/', 1)
+                page_path = os.path.join(repo_directory, platform, command + '.md')
+                try:
+                    os.unlink(get_render_cache_path_by_stat(page_path, old_doc['mtime'], old_doc['size']))
+                except FileNotFoundError:
+                    pass
+
+        for key in changes['added'] + changes['modified']:
+            platform, command = key.split('/', 1)
+            docs[key] = get_page_search_doc(os.path.join(repo_directory, platform, command + '.md'), command)
+
+        search_entry['stamp'] = stamp
+        save_cache('search/forward.json', SEARCH_INDEX_VERSION, forward_index)
+
+    if 'TLDR_NO_CACHE' not in os.environ:
+        for key in changes['added'] + changes['modified']:
+            platform, command = key.split('/', 1)
+            get_rendered_page(os.path.join(repo_directory, platform, command + '.md'))
+
+
+def action_update():
+    """Update all tldr pages repo."""
+
+    import time
+    import concurrent.futures
+
+    log = logging.getLogger(__name__)
+
+    repo_directory_list = [
+        _ for _ in get_config()['repo_directory_list']
+        if not is_pack_path(_) and split_zip_path(_) is None # a pack or a zip archive can not be pulled
+    ]
+    command = ['git', 'pull', '--stat']
+    command_str = ' '.join(command)
+
+    if len(repo_directory_list) == 0:
+        return []
+
+    language_list = get_language_list(get_config().get('language_list'))
+    index_cache = get_index_cache()
+    index_stamp_map = {
+        _: get_index_stamp(_, index_cache[_]['pages'].keys())
+        for _ in expand_repo_directory_list(repo_directory_list, language_list) if _ in index_cache
+    }
+
+    def pull(repo_directory):
+        head_before = get_git_head(repo_directory)
+        result = update_repo(repo_directory, command, UPDATE_TIMEOUT, output_lock)
+        result['changes'] = None # {language dir or repo_directory: changes, }
+        if result['return_code'] == 0 and head_before is not None:
+            head_after = get_git_head(repo_directory)
+            if head_after is not None and head_after != head_before:
+                result['head_before'], result['head_after'] = head_before, head_after
+                result['changes'] = {}
+                for page_directory in expand_repo_directory_list([repo_directory], language_list):
+                    changes = get_git_page_changes(page_directory, head_before, head_after)
+                    if changes is not None:
+                        result['changes'][page_directory] = changes
+
+        return result
+
+    log.info('Run %r in %d repo ...', command_str, len(repo_directory_list))
+    output_lock = threading.Lock()
+    max_workers = min(UPDATE_MAX_WORKERS, len(repo_directory_list))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_list = [executor.submit(pull, repo_directory) for repo_directory in repo_directory_list]
+        result_list = [future.result() for future in future_list]
+
+    # only pages changed are re-indexed and re-rendered, other repos are rebuilt when used
+    manifest = {'time': int(time.time()), 'repos': []}
+    for result in result_list:
+        if result['changes'] is None:
+            continue
+
+        for page_directory, changes in result['changes'].items():
+            if page_directory in index_stamp_map:
+                try:
+                    apply_page_changes(page_directory, changes, index_stamp_map[page_directory])
+                except Exception as e:
+                    log.debug('Error when apply changes of %r: %r %r', page_directory, type(e), e)
+
+            manifest_entry = {'repo_directory': page_directory, 'head_before': result['head_before'], 'head_after': result['head_after']}
+            for change_type in ('added', 'modified', 'deleted'):
+                manifest_entry[change_type] = [os.path.join(page_directory, *_.split('/', 1)) + '.md' for _ in changes[change_type]]
+            manifest['repos'].append(manifest_entry)
+
+    save_cache('changes.json', UPDATE_CHANGES_VERSION, manifest)
+
+    label_width = max([len(get_repo_label(_['repo_directory'])) for _ in result_list])
+    log.info('Summary of %r:', command_str)
+    for result in result_list:
+        if result['timeout']:
+            return_code_str = style(f'timeout after {UPDATE_TIMEOUT}s', fg='bright_red')
+        elif result['return_code'] is None:
+            return_code_str = style('error', fg='bright_red')
+        else:
+            return_code_color = 'green' if result['return_code'] == 0 else 'bright_red'
+            return_code_str = style(f'return code {result["return_code"]}', fg=return_code_color)
+
+        if result['changes'] is not None:
+            count_list = [sum([len(_[change_type]) for _ in result['changes'].values()]) for change_type in ('added', 'modified', 'deleted')]
+            return_code_str += ', {} added, {} modified, {} deleted'.format(*count_list)
+
+        label = get_repo_label(result['repo_directory'])
+        log.info('%s  %6.2fs  %s', label.ljust(label_width), result['time_used'], return_code_str)
+
+    return result_list
+
+
+def log_command_not_found(command, verbose=True):
+    log = logging.getLogger(__name__)
+
+    log.error("Command not found: %r", command)
+    suggestion_list = suggest_commands(command)
+    if len(suggestion_list) > 0:
+        log.error("Did you mean: %s", ', '.join([style(_, bold=True) for _ in suggestion_list]))
+
+    if verbose:
+        log.error("You can try to find a page on all platforms by run %r.", f'tldr -p all {command}')
+        log.error("If still nothing, you can create a new issue against the tldr-pages/tldr GitHub repository: %r,", f'https://github.com/tldr-pages/tldr/issues/new?title=page%20request:%20{command}')
+        log.error("or create a Pull Request on GitHub.")
+
+
+def iter_page_output(command, page_path_list):
+    """Yield output of pages in bytes, the title line, then the page from the prerender dir or the render cache.
+    Byte-identical pages are shown once, after the title lines of all of them. A page which can not be read is logged and skipped.
+    """
+
+    log = logging.getLogger(__name__)
+
+    if len(page_path_list) > 1:
+        group_list = group_same_pages(page_path_list)
+    else:
+        group_list = [(page_path_list, None)]
+
+    for same_page_path_list, similar_page_path in group_list:
+        for page_path in same_page_path_list:
+            title = style(command, underline=True, bold=True) + ' - ' + style(page_path, underline=True, bold=True)
+            if similar_page_path is not None and page_path is same_page_path_list[0]:
+                title += f' (nearly the same as {similar_page_path})'
+            yield (title + '\n').encode('utf-8', 'surrogateescape')
+
+        page_path = same_page_path_list[0]
+        try:
+            prerendered_page_path = get_prerendered_page_path(page_path)
+            if prerendered_page_path is not None:
+                with open(prerendered_page_path, 'rb') as f:
+                    data = f.read()
+            else:
+                data = get_rendered_page(page_path)
+        except OSError as e: # removed since looked up
+            log.error('Can not read page %r: %r', page_path, e)
+            continue
+
+        yield data
+
+
+def print_pages(command, page_path_list):
+    """Write pages one by one to the buffered binary stdout, flushed once at exit"""
+
+    sys.stdout.flush() # what is written to the text layer before
+    for data in iter_page_output(command, page_path_list):
+        write_stdout_bytes(data, flush_text=False)
+
+
+def action_find(command, platform, output_format='ansi'):
+    """Find and display the tldr pages of a command."""
+
+    assert type(command) == str
+    assert platform is None or type(platform) == str
+
+    if platform:
+        page_path_list = get_page_path_list(command, platform)
+    else:
+        page_path_list = get_page_path_list(command, 'default')
+    
+    if len(page_path_list) == 0:
+        log_command_not_found(command)
+        sys.exit(1)
+    elif output_format == 'json':
+        print_pages_json(command, page_path_list)
+    else:
+        print_pages(command, page_path_list)
+
+
+def print_pages_json(command, page_path_list):
+    """One JSON array of pages, see Page.to_dict()"""
+
+    import json
+
+    client = get_client()
+    result_list = []
+    for page_path in page_path_list:
+        repo_directory, platform = os.path.split(os.path.dirname(page_path))
+        result_list.append({
+            'command': command,
+            'platform': platform,
+            'repo_directory': repo_directory,
+            'page_path': page_path,
+            'page': client.get_page(page_path).to_dict(),
+        })
+
+    write_stdout_bytes((json.dumps(result_list, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+def read_batch_command_list(stream):
+    """One command per line or argument, words joined by '-' like command line arguments"""
+
+    command_list = []
+    for line in stream:
+        word_list = line.split()
+        if len(word_list) > 0:
+            command_list.append('-'.join(word_list))
+
+    return command_list
+
+
+def action_batch_find(command_list, platform):
+    """Find and display the tldr pages of many commands, from arguments or stdin."""
+
+    assert command_list is None or type(command_list) == list
+    assert platform is None or type(platform) == str
+
+    if command_list is None or command_list == ['-']:
+        command_list = read_batch_command_list(sys.stdin)
+    else: # e.g. tldr -b "git commit"
+        command_list = read_batch_command_list(command_list)
+
+    page_path_map = get_page_path_map(command_list, platform or 'default')
+    not_found_count = 0
+    for command in command_list:
+        print(style(f'==> {command} <==', bold=True))
+        page_path_list = page_path_map.get(command, [])
+        if len(page_path_list) == 0:
+            print(f'Not found: {command}')
+            sys.stdout.flush()
+            log_command_not_found(command, verbose=False)
+            not_found_count += 1
+        else:
+            print_pages(command, page_path_list)
+
+    if not_found_count > 0:
+        sys.exit(1)
+
+
+def action_search(query, platform):
+    """Full text search in all tldr pages."""
+
+    assert type(query) == str
+    assert platform is None or type(platform) == str
+
+    log = logging.getLogger(__name__)
+
+    result_list = search_pages(query, platform or 'all')
+    if len(result_list) == 0:
+        log.error('Nothing found: %r', query)
+        sys.exit(1)
+
+    for result in result_list:
+        print(style(result['command'], bold=True) + f' ({result["platform"]}) - {result["description"]}')
+        print('    ' + style(result['page_path'], underline=True))
+
+
+def action_list_command(command, platform, glob=None, regex=None, sort=False, unique=False, null=False):
+    """Locate all tldr page files path of the command, streamed as repos are scanned."""
+    
+    assert command is None or type(command) == str
+    assert platform is None or type(platform) == str
+
+    log = logging.getLogger(__name__)
+
+    if regex is not None:
+        try:
+            re.compile(regex)
+        except re.error as e:
+            log.error('Bad regex %r: %s', regex, e)
+            sys.exit(1)
+
+    page_path_iter = iter_page_path(command, platform or 'all', glob, regex, unique)
+    if sort:
+        page_path_iter = sorted(page_path_iter)
+
+    end = '\0' if null else '\n'
+    for i, page_path in enumerate(page_path_iter):
+        sys.stdout.write(page_path + end)
+        if i == 0:
+            sys.stdout.flush() # the first result arrives immediately, e.g. in fzf
+
+
+def action_complete(prefix, platform):
+    """Print names of commands start with prefix, one per line."""
+
+    assert type(prefix) == str
+    assert platform is None or type(platform) == str
+
+    name_list = complete_commands(prefix, platform or 'default')
+    if len(name_list) > 0:
+        sys.stdout.write('\n'.join(name_list) + '\n')
+
+
+def get_completion_script(shell):
+    """Shell completion script, which completes command names by `tldr --complete`"""
+
+    option_str = '--help --version --init --list --update --search --batch --platform'
+    platform_str = ' '.join(PLATFORM_CHOICES)
+
+    if shell == 'bash':
+        return f'''# bash completion for tldr, add to ~/.bashrc: eval "$(tldr --completion bash)"
+_tldr_complete() {{
+    local cur="${{COMP_WORDS[COMP_CWORD]}}" prev="${{COMP_WORDS[COMP_CWORD-1]}}" platform=default i
+    case "$prev" in
+        -p|--platform)
+            COMPREPLY=($(compgen -W "{platform_str}" -- "$cur"))
+            return;;
+    esac
+    if [[ "$cur" == -* ]]; then
+        COMPREPLY=($(compgen -W "{option_str}" -- "$cur"))
+        return
+    fi
+    for ((i = 1; i < COMP_CWORD - 1; i++)); do
+        case "${{COMP_WORDS[i]}}" in
+            -p|--platform) platform="${{COMP_WORDS[i+1]}}";;
+        esac
+    done
+    COMPREPLY=($(tldr --complete="$cur" --platform="$platform" 2>/dev/null))
+}}
+complete -F _tldr_complete tldr
+'''
+    elif shell == 'zsh':
+        return f'''#compdef tldr
+# zsh completion for tldr, add to ~/.zshrc: eval "$(tldr --completion zsh)"
+_tldr() {{
+    local platform=default i
+    if [[ "$words[CURRENT-1]" == (-p|--platform) ]]; then
+        compadd -- {platform_str}
+        return
+    fi
+    if [[ "$PREFIX" == -* ]]; then
+        compadd -- {option_str}
+        return
+    fi
+    for ((i = 2; i < CURRENT - 1; i++)); do
+        [[ "$words[i]" == (-p|--platform) ]] && platform="$words[i+1]"
+    done
+    compadd -- ${{(f)"$(tldr --complete="$PREFIX" --platform="$platform" 2>/dev/null)"}}
+}}
+if [[ "$funcstack[1]" == _tldr ]]; then
+    _tldr "$@"
+else
+    compdef _tldr tldr
+fi
+'''
+    elif shell == 'fish':
+        return f'''# fish completion for tldr, add to ~/.config/fish/config.fish: tldr --completion fish | source
+function __tldr_platform
+    set -l tokens (commandline -opc)
+    set -l platform default
+    for i in (seq 2 (math (count $tokens) - 1))
+        if contains -- $tokens[$i] -p --platform
+            set platform $tokens[(math $i + 1)]
+        end
+    end
+    echo $platform
+end
+complete -c tldr -f -a '(tldr --complete=(commandline -ct) --platform=(__tldr_platform) 2>/dev/null)'
+complete -c tldr -s p -l platform -x -a '{platform_str}' -d 'Specify platform'
+'''
+    else:
+        raise ValueError(f'Unsupported shell: {shell!r}')
+
+
+def action_compile_pack(pack_path):
+    """Compile all pages in all repo into one read-only page pack file."""
+
+    import json
+    import struct
+
+    assert type(pack_path) == str
+
+    log = logging.getLogger(__name__)
+
+    pack_path = os.path.abspath(pack_path)
+    if not pack_path.endswith(PACK_SUFFIX):
+        log.error('Page pack file name must end with %r: %r', PACK_SUFFIX, pack_path)
+        sys.exit(1)
+
+    repo_directory_list = [_ for _ in get_repo_directory_list() if not _.startswith(pack_path + os.sep)]
+    platform_list = []
+    entry_list = [] # [(name, repo_index, platform_index, page_path), ]
+    for repo_index, repo_directory in enumerate(repo_directory_list):
+        for platform, command in get_index(repo_directory):
+            if platform not in platform_list:
+                platform_list.append(platform)
+            page_path = os.path.join(repo_directory, platform, command + '.md')
+            entry_list.append((command.encode('utf-8'), repo_index, platform_list.index(platform), page_path))
+
+    entry_list.sort()
+
+    record_struct = struct.Struct(PACK_RECORD_FORMAT)
+    table = bytearray()
+    names = bytearray()
+    bodies = bytearray()
+    for name, repo_index, platform_index, page_path in entry_list:
+        body = read_page_bytes(page_path)
+        table += record_struct.pack(len(names), len(name), repo_index, platform_index, 0, len(bodies), len(body))
+        names += name
+        bodies += body
+
+    meta = json.dumps({'repos': repo_directory_list, 'platforms': platform_list}).encode('utf-8')
+    meta_offset = struct.calcsize(PACK_HEADER_FORMAT)
+    table_offset = meta_offset + len(meta)
+    names_offset = table_offset + len(table)
+    bodies_offset = names_offset + len(names)
+    header = struct.pack(PACK_HEADER_FORMAT, PACK_MAGIC, PACK_VERSION, len(entry_list), meta_offset, len(meta), table_offset, names_offset, bodies_offset)
+
+    write_file_atomic(pack_path, b''.join([header, meta, table, names, bodies]))
+    log.info('Compiled %d pages in %d repo into %r, %d bytes', len(entry_list), len(repo_directory_list), pack_path, bodies_offset + len(bodies))
+
+
+def action_prerender(prerender_directory):
+    """Render all pages in all repo with the current style config into a dir, by a process pool."""
+
+    import json
+    import time
+    import shutil
+    import multiprocessing
+    import concurrent.futures
+
+    assert type(prerender_directory) == str
+
+    log = logging.getLogger(__name__)
+
+    prerender_directory = os.path.abspath(prerender_directory)
+    stamp_path = os.path.join(prerender_directory, 'stamp.json')
+    pages_directory = os.path.join(prerender_directory, 'pages')
+    temp_pages_directory = os.path.join(prerender_directory, 'pages.tmp')
+    old_pages_directory = os.path.join(prerender_directory, 'pages.old')
+    if os.path.isdir(prerender_directory) and not set(os.listdir(prerender_directory)) <= PRERENDER_NAME_SET:
+        log.error('Not a prerender dir, and not empty: %r', prerender_directory)
+        sys.exit(1)
+
+    # left by an interrupted run
+    for directory in (temp_pages_directory, old_pages_directory):
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+
+    time_start = time.monotonic()
+    stamp = {'version': PRERENDER_VERSION, 'style_hash': get_style_hash()} # before fork, workers inherit the style caches
+    page_path_list = get_page_path_list(None, 'all')
+    chunk_list = [page_path_list[i:i + PRERENDER_CHUNK_SIZE] for i in range(0, len(page_path_list), PRERENDER_CHUNK_SIZE)]
+
+    # workers inherit the config and caches by fork, spawn is the only choice on Windows
+    mp_context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with concurrent.futures.ProcessPoolExecutor(mp_context=mp_context) as executor:
+        page_count = sum(executor.map(prerender_pages, [temp_pages_directory] * len(chunk_list), chunk_list))
+
+    # the old pages are used until replaced, a dir can not be replaced if not empty
+    os.makedirs(temp_pages_directory, exist_ok=True)
+    if os.path.exists(stamp_path):
+        os.unlink(stamp_path)
+    if os.path.isdir(pages_directory):
+        os.replace(pages_directory, old_pages_directory)
+    os.replace(temp_pages_directory, pages_directory)
+    write_file_atomic(stamp_path, json.dumps(stamp).encode('utf-8'))
+    if os.path.isdir(old_pages_directory):
+        shutil.rmtree(old_pages_directory)
+    log.info('Prerendered %d pages into %r in %.2fs', page_count, prerender_directory, time.monotonic() - time_start)
+    if get_config()['color_output'] == 'auto':
+        log.warning('color_output is "auto", pages are rendered %s color, used only when output is%s a terminal', 'with' if is_color_output() else 'without', '' if is_color_output() else ' not')
+
+
+def action_version():
+    print(f'{__title__}, by {__author__}, version {__version__}')
+    print(f'Homepage: {__homepage__}')
+    print(__specification__)
+
+
+def get_daemon_socket_path():
+    return os.path.join(get_cache_dir_path(), 'daemon.sock')
+
+
+class DaemonConnection:
+    """Output of a request to the daemon, sent to the client as frames: kind (1 byte) + size (4 bytes) + payload"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pending = bytearray()
+
+    def send(self, kind, data):
+        self.pending += kind + len(data).to_bytes(4, 'big') + data
+        if len(self.pending) >= DAEMON_SEND_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if len(self.pending) > 0:
+            self.conn.sendall(self.pending)
+            self.pending = bytearray()
+
+
+class DaemonStream:
+    """File-like stdout or stderr of a request to the daemon, accept both str and bytes"""
+
+    def __init__(self, connection, kind, isatty):
+        self.connection = connection
+        self.kind = kind
+        self._isatty = isatty
+        self.buffer = self
+        self.encoding = 'utf-8'
+
+    def write(self, data):
+        if type(data) == str:
+            data = data.encode('utf-8')
+        if len(data) > 0:
+            self.connection.send(self.kind, data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return self._isatty
+
+
+def get_daemon_stamp():
+    """Changes if the config file or any repo changed"""
+
+    stamp = []
+    try:
+        stamp.append(os.stat(get_config_path()).st_mtime_ns)
+    except OSError:
+        stamp.append(None)
+
+    for repo_directory in get_repo_directory_list():
+        entry = get_index_cache().get(repo_directory)
+        platforms = entry['pages'].keys() if entry is not None else []
+        stamp.append(get_index_stamp(repo_directory, platforms))
+
+    return stamp
+
+
+def clear_style_caches():
+    for func in (is_color_output, get_escape_str, get_style_table, get_page_style, get_escape_str_by_type, get_style_hash, get_prerender_directory, get_client):
+        func.cache_clear()
+
+
+def clear_all_caches():
+    clear_style_caches()
+    for func in (get_config, open_pack, open_zip, get_index_cache, get_page_hash_cache, get_index, get_search_index, get_suggest_cache):
+        func.cache_clear()
+
+
+def handle_daemon_request(conn, state):
+    """Run main() for one request, with output sent back to the client"""
+
+    import io
+    import json
+
+    log = logging.getLogger(__name__)
+
+    request_data = bytearray()
+    while True:
+        data = conn.recv(65536)
+        if len(data) == 0:
+            break
+        request_data += data
+    request = json.loads(request_data.decode('utf-8'))
+
+    for name in DAEMON_FORWARD_ENV_LIST:
+        if name in request['env']:
+            os.environ[name] = request['env'][name]
+        elif name in os.environ:
+            del os.environ[name]
+
+    # watch the config and repos, drop everything stale
+    daemon_stamp = get_daemon_stamp()
+    if daemon_stamp != state.get('stamp'):
+        log.debug('Config or repo changed, clear caches')
+        clear_all_caches()
+        daemon_stamp = get_daemon_stamp()
+    state['stamp'] = daemon_stamp
+
+    connection = DaemonConnection(conn)
+    saved_streams = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin = io.StringIO(request['stdin'] or '')
+    sys.stdout = DaemonStream(connection, b'o', request['stdout_isatty'])
+    sys.stderr = DaemonStream(connection, b'e', request['stderr_isatty'])
+    exit_code = 0
+    try:
+        clear_style_caches()
+        init_logging(force=True)
+        main(request['argv'])
+    except SystemExit as e:
+        if e.code is None:
+            exit_code = 0
+        elif type(e.code) == int:
+            exit_code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except Exception:
+        import traceback
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        clear_style_caches()
+        init_logging(force=True, gap=False)
+
+    connection.send(b'x', str(exit_code).encode('utf-8'))
+    connection.flush()
+
+
+def action_daemon():
+    """Serve requests on a unix socket, keep config, index and rendered pages in memory."""
+
+    import socket
+
+    log = logging.getLogger(__name__)
+
+    socket_path = get_daemon_socket_path()
+    if os.path.exists(socket_path):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(socket_path)
+            log.error('Daemon is already running: %r', socket_path)
+            sys.exit(1)
+        except OSError:
+            os.unlink(socket_path) # stale
+        finally:
+            client.close()
+
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077) # only the owner can connect
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    server.listen(16)
+
+    log.info('Daemon listening on %r', socket_path)
+    state = {}
+    try:
+        while True:
+            conn, _ = server.accept()
+            conn.settimeout(DAEMON_TIMEOUT) # a client which never sends would block all others
+            with conn:
+                try:
+                    handle_daemon_request(conn, state)
+                except (BrokenPipeError, ConnectionResetError):
+                    log.debug('Client went away')
+                except TimeoutError:
+                    log.warning('Client timed out')
+                except Exception as e:
+                    log.error('Error when handle request: %r %r', type(e), e)
+    except KeyboardInterrupt:
+        log.info('Daemon stopped')
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def get_serve_etag(*parts):
+    import hashlib
+
+    key = '\0'.join([str(_) for _ in parts])
+    return '"' + hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest() + '"'
+
+
+def get_serve_html(title, body):
+    import html
+
+    return f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(title)}</title></head><body>\n{body}</body></html>\n'
+
+
+def get_serve_page_url(command, platform):
+    import urllib.parse
+
+    return f'/page/{urllib.parse.quote(command)}?platform={urllib.parse.quote(platform)}'
+
+
+def refresh_serve_client(client, state):
+    """Drop what is stale if repos changed on disk, at most once per SERVE_REFRESH_INTERVAL"""
+
+    import time
+
+    log = logging.getLogger(__name__)
+
+    with state['lock']:
+        now = time.monotonic()
+        if now - state.get('refresh_time', -SERVE_REFRESH_INTERVAL) < SERVE_REFRESH_INTERVAL:
+            return
+        state['refresh_time'] = now
+
+        if client.refresh():
+            log.info('Repo changed, index dropped')
+            for func in (get_index, get_search_index):
+                func.cache_clear()
+
+
+def handle_serve_request(client, url, if_none_match=None):
+    """Handle a GET request of tldr --serve.
+    GET /page/<command>, /list, /search?q=<query>, with optional platform= and format=html|text|json
+    Return: (status, {header: value}, body in bytes)
+    """
+
+    import json
+    import html
+    import urllib.parse
+
+    split_result = urllib.parse.urlsplit(url)
+    query = {key: value_list[-1] for key, value_list in urllib.parse.parse_qs(split_result.query).items()}
+    path = urllib.parse.unquote(split_result.path)
+
+    def is_not_modified(etag):
+        if if_none_match is None:
+            return False
+
+        etag_list = [_.strip() for _ in if_none_match.split(',')]
+        return '*' in etag_list or etag in etag_list or 'W/' + etag in etag_list
+
+    def respond(status, text, content_type='text/plain', etag=None):
+        headers = {'Content-Type': f'{content_type}; charset=utf-8'}
+        if etag is not None:
+            headers['ETag'] = etag
+            headers['Cache-Control'] = 'no-cache' # always revalidate
+
+        return status, headers, text.encode('utf-8', 'surrogateescape')
+
+    output_format = query.get('format', 'html')
+    if output_format not in SERVE_FORMAT_LIST:
+        return respond(400, f'Bad format: {output_format!r}\n')
+    content_type = {'html': 'text/html', 'text': 'text/plain', 'json': 'application/json'}[output_format]
+
+    if 'platform' in query:
+        try:
+            client.get_platform_list(query['platform'])
+        except ValueError as e:
+            return respond(400, f'{e}\n')
+
+    if path.startswith('/page/') and len(path) > len('/page/'):
+        command = path[len('/page/'):]
+        platform = query.get('platform', 'default')
+        page_path_list = client.list_pages(command, platform)
+        if len(page_path_list) == 0:
+            return respond(404, f'Page not found: {command!r}\n')
+
+        identity_list = []
+        for page_path in page_path_list:
+            try:
+                identity_list += [os.path.abspath(page_path), *stat_page(page_path)]
+            except OSError: # removed just now
+                return respond(404, f'Page not found: {command!r}\n')
+        etag = get_serve_etag('page', output_format, client.style_hash, *identity_list)
+        if is_not_modified(etag):
+            return respond(304, '', content_type, etag)
+
+        result_list = client.find(command, platform, render=output_format != 'html')
+        if output_format == 'json':
+            text = json.dumps(result_list, ensure_ascii=False)
+        elif output_format == 'text':
+            text = ''.join([f'{_["command"]} - {_["page_path"]}\n{_["text"]}' for _ in result_list])
+        else:
+            text = get_serve_html(command, ''.join([
+                f'<h2>{html.escape(_["command"])} <small>({html.escape(_["platform"])})</small></h2>\n'
+                f'<p><code>{html.escape(_["page_path"])}</code></p>\n'
+                + render_page_html(client.get_page(_["page_path"]))
+                for _ in result_list
+            ]))
+
+        return respond(200, text, content_type, etag)
+
+    if path == '/list':
+        regex = query.get('regex')
+        if regex is not None:
+            try:
+                re.compile(regex)
+            except re.error as e:
+                return respond(400, f'Bad regex {regex!r}: {e}\n')
+
+        etag = get_serve_etag('list', output_format, split_result.query, json.dumps(client.get_stamp_list(), sort_keys=True))
+        if is_not_modified(etag):
+            return respond(304, '', content_type, etag)
+
+        page_path_list = list(client.iter_pages(query.get('command'), query.get('platform', 'all'), query.get('glob'), regex, 'unique' in query))
+        if output_format == 'json':
+            text = json.dumps(page_path_list, ensure_ascii=False)
+        elif output_format == 'text':
+            text = ''.join([_ + '\n' for _ in page_path_list])
+        else:
+            item_list = []
+            for page_path in page_path_list:
+                platform_path, filename = os.path.split(page_path)
+                url = get_serve_page_url(filename[:-3], os.path.basename(platform_path))
+                item_list.append(f'<li><a href="{html.escape(url)}">{html.escape(page_path)}</a></li>\n')
+            text = get_serve_html('tldr pages', '<ul>\n' + ''.join(item_list) + '</ul>\n')
+
+        return respond(200, text, content_type, etag)
+
+    if path == '/search':
+        search_query = query.get('q', '')
+        if search_query.strip() == '':
+            return respond(400, 'Missing search query: q\n')
+
+        platform = query.get('platform', 'all')
+        etag = get_serve_etag('search', output_format, split_result.query, get_search_index()['generation'])
+        if is_not_modified(etag):
+            return respond(304, '', content_type, etag)
+
+        result_list = search_pages(search_query, platform)
+        if output_format == 'json':
+            text = json.dumps(result_list, ensure_ascii=False)
+        elif output_format == 'text':
+            text = ''.join([f'{_["command"]} ({_["platform"]}) - {_["description"]}\n    {_["page_path"]}\n' for _ in result_list])
+        else:
+            text = get_serve_html(search_query, '<ul>\n' + ''.join([
+                f'<li><a href="{html.escape(get_serve_page_url(_["command"], _["platform"]))}">{html.escape(_["command"])}</a> ({html.escape(_["platform"])}) - {html.escape(_["description"])}</li>\n'
+                for _ in result_list
+            ]) + '</ul>\n')
+
+        return respond(200, text, content_type, etag)
+
+    return respond(404, f'Not found: {path!r}, try /page/<command>, /list or /search?q=<query>\n')
+
+
+def make_serve_server(client, port):
+    """A threaded HTTP server on localhost, port 0 for any free port"""
+
+    import http.server
+
+    log = logging.getLogger(__name__)
+
+    state = {'lock': threading.Lock()}
+
+    class ServeRequestHandler(http.server.BaseHTTPRequestHandler):
+        server_version = f'{__title__}/{__version__}'
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            refresh_serve_client(client, state)
+            try:
+                status, headers, body = handle_serve_request(client, self.path, self.headers.get('If-None-Match'))
+            except Exception as e:
+                log.error('Error when handle request %r: %r %r', self.path, type(e), e)
+                status, headers, body = 500, {'Content-Type': 'text/plain; charset=utf-8'}, b'Internal error\n'
+
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            log.debug('%s - %s', self.address_string(), format % args)
+
+    server = http.server.ThreadingHTTPServer((SERVE_HOST, port), ServeRequestHandler)
+    server.daemon_threads = True
+    return server
+
+
+def action_serve(port):
+    """Serve pages over HTTP on localhost, keep index and rendered pages in memory."""
+
+    log = logging.getLogger(__name__)
+
+    client = TldrClient(get_config(), color=False, persistent=True)
+    try:
+        server = make_serve_server(client, port)
+    except OSError as e:
+        log.error('Can not listen on %s:%d: %r', SERVE_HOST, port, e)
+        sys.exit(1)
+
+    log.info('Serving on http://%s:%d/', *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info('Server stopped')
+    finally:
+        server.server_close()
+
+
+def parse_args(args=sys.argv[1:]):
+    import argparse
+
+    log = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser(
+        description='Yet another python client for tldr-pages/tldr. View tldr pages in multi repo, multi platform, any language at the same time.',
+        epilog='https://github.com/Phuker/multi-tldr',
+        add_help=True
+    )
+    group = parser.add_mutually_exclusive_group(required=False)
+    group.add_argument('-i', '--init', action="store_true", help="Interactively gererate config file")
+    group.add_argument('-l', '--list', action='store_true', help="Print all tldr page files path (of a command if specified) in all repo on all/specified platform")
+    group.add_argument('-u', '--update', action="store_true", help="Pull all git repo")
+    group.add_argument('-s', '--search', action="store_true", help="Full text search in all tldr pages, command is the search terms")
+    group.add_argument('--complete', metavar='PREFIX', help="Print names of commands start with PREFIX on all/specified platform, for shell completion")
+    group.add_argument('--completion', metavar='SHELL', choices=['bash', 'zsh', 'fish'], help="Print the shell completion script, SHELL is one of 'bash', 'zsh', 'fish'")
+    group.add_argument('--prerender', metavar='DIR', help="Render all pages in all repo with the current style config into DIR, which can be set as prerender_directory in config")
+    group.add_argument('--compile-pack', metavar='PATH', help=f"Compile all pages in all repo into one read-only page pack file, whose name ends with {PACK_SUFFIX!r}, which can be used in repo_directory_list")
+    group.add_argument('--daemon', action="store_true", help="Run as a daemon, later tldr commands are served by it through a unix socket")
+    group.add_argument('--serve', metavar='PORT', nargs='?', type=int, const=SERVE_DEFAULT_PORT, help=f"Serve pages over HTTP on localhost:PORT, {SERVE_DEFAULT_PORT} by default, GET /page/<command>, /list or /search?q=<query>")
+    group.add_argument('-b', '--batch', action="store_true", help="Find many commands, each argument is a command, read from stdin line by line if no argument or '-'")
+    
+    parser.add_argument('command', help="Command to query", nargs='*')
+    parser.add_argument('-p', '--platform', help="Specify platform. Special virtual platform options are 'all' and 'default'", choices=PLATFORM_CHOICES)
+
+    parser.add_argument('-v', '--version', action="store_true", help="Show version and exit")
+    parser.add_argument('--format', choices=['ansi', 'json'], help="Output format of pages, 'ansi' (default) is styled by the config, 'json' is the parsed structure")
+    parser.add_argument('--json', action='store_const', dest='format', const='json', help="Same as --format json")
+    parser.add_argument('--profile', action="store_true", help="Print time used by each phase and counters to stderr, same as TLDR_TRACE environment variable")
+
+    list_group = parser.add_argument_group('options of --list')
+    list_group.add_argument('--glob', metavar='PATTERN', help="Only commands match the shell style wildcard PATTERN, e.g. 'git-*'")
+    list_group.add_argument('--regex', metavar='PATTERN', help="Only commands match the regular expression PATTERN, e.g. '^git-(push|pull)$'")
+    list_group.add_argument('--sort', action="store_true", help="Sort output, which is output after all repo are scanned")
+    list_group.add_argument('--unique', action="store_true", help="Only the first page of each platform/command in all repo")
+    list_group.add_argument('-0', '--null', action="store_true", help="End each path with NUL instead of newline, e.g. for xargs -0")
+
+    args = parser.parse_args(args)
+
+    args.command_list = args.command if len(args.command) > 0 else None
+    if len(args.command) > 0:
+        args.query = ' '.join(args.command)
+        args.command = '-'.join(args.command)
+    else:
+        args.query = None
+        args.command = None
+
+    ctrl_group_set = args.init or args.list or args.update or args.search or args.batch or args.daemon or args.serve is not None or args.prerender is not None or args.compile_pack is not None or args.complete is not None or args.completion is not None
+    ok_conditions = [
+        args.version,
+        args.init and args.command is None and args.platform is None,
+        args.list,
+        args.update and args.command is None and args.platform is None,
+        args.search and args.query is not None,
+        args.batch,
+        args.daemon and args.command is None and args.platform is None,
+        args.serve is not None and args.command is None and args.platform is None,
+        args.prerender is not None and args.command is None and args.platform is None,
+        args.compile_pack is not None and args.command is None and args.platform is None,
+        args.complete is not None and args.command is None,
+        args.completion is not None and args.command is None and args.platform is None,
+        not ctrl_group_set and args.command is not None,
+    ]
+
+    list_option_set = args.glob is not None or args.regex is not None or args.sort or args.unique or args.null
+
+    if not any(ok_conditions) or (list_option_set and not args.list) or (args.format is not None and (ctrl_group_set or args.command is None)):
         log.error('Bad arguments')
         parser.print_help()
         sys.exit(1)
@@ -493,7 +3781,7 @@ def parse_args(args=sys.argv[1:]):
     return args
 
 
-def init_logging():
+def init_logging(force=False, gap=True):
     escape_bold = get_escape_str(bold=True)
     escape_reset = get_escape_str(reset=True)
     escape_fg_default = get_escape_str(fg='reset')
@@ -512,7 +3800,8 @@ def init_logging():
     if logging_stream.isatty():
         logging_date_format = '%H:%M:%S'
     else:
-        print('', file=logging_stream)
+        if gap:
+            print('', file=logging_stream)
         logging_date_format = '%Y-%m-%d %H:%M:%S'
 
     logging.basicConfig(
@@ -520,44 +3809,179 @@ def init_logging():
         format=logging_format,
         datefmt=logging_date_format,
         stream=logging_stream,
+        force=force, # re-init, for requests to the daemon
     )
 
-    logging.addLevelName(logging.CRITICAL, f'{escape_fg_red}{logging.getLevelName(logging.CRITICAL)}{escape_fg_default}')
-    logging.addLevelName(logging.ERROR, f'{escape_fg_red}{logging.getLevelName(logging.ERROR)}{escape_fg_default}')
-    logging.addLevelName(logging.WARNING, f'{escape_fg_yellow}{logging.getLevelName(logging.WARNING)}{escape_fg_default}')
-    logging.addLevelName(logging.INFO, f'{escape_fg_cyan}{logging.getLevelName(logging.INFO)}{escape_fg_default}')
-    logging.addLevelName(logging.DEBUG, f'{escape_fg_cyan}{logging.getLevelName(logging.DEBUG)}{escape_fg_default}')
+    logging.addLevelName(logging.CRITICAL, f'{escape_fg_red}CRITICAL{escape_fg_default}')
+    logging.addLevelName(logging.ERROR, f'{escape_fg_red}ERROR{escape_fg_default}')
+    logging.addLevelName(logging.WARNING, f'{escape_fg_yellow}WARNING{escape_fg_default}')
+    logging.addLevelName(logging.INFO, f'{escape_fg_cyan}INFO{escape_fg_default}')
+    logging.addLevelName(logging.DEBUG, f'{escape_fg_cyan}DEBUG{escape_fg_default}')
 
 
-def main():
+def main(argv=None):
     """Real entry point"""
 
-    init_logging()
-    args = parse_args()
+    if argv is None:
+        init_logging()
+        args = parse_args()
+    else: # request to the daemon, logging already inited
+        args = parse_args(argv)
+
+    if args.profile:
+        start_trace() # usually started by _main() already, unless an abbreviation like --prof is used
 
     if args.version:
         action_version()
     elif args.init:
         action_init()
     elif args.list:
-        action_list_command(args.command, args.platform)
+        action_list_command(args.command, args.platform, args.glob, args.regex, args.sort, args.unique, args.null)
     elif args.update:
         action_update()
+    elif args.search:
+        action_search(args.query, args.platform)
+    elif args.batch:
+        action_batch_find(args.command_list, args.platform)
+    elif args.daemon:
+        action_daemon()
+    elif args.serve is not None:
+        action_serve(args.serve)
+    elif args.prerender is not None:
+        action_prerender(args.prerender)
+    elif args.compile_pack is not None:
+        action_compile_pack(args.compile_pack)
+    elif args.complete is not None:
+        action_complete(args.complete, args.platform)
+    elif args.completion is not None:
+        print(get_completion_script(args.completion), end='')
     else:
-        action_find(args.command, args.platform)
+        action_find(args.command, args.platform, args.format or 'ansi')
+
+
+def is_daemon_forwardable(argv):
+    """Whether argv can be run by the daemon, interactive, long running or writing actions run in process"""
+
+    for arg in argv:
+        if arg == '--':
+            return False
+        elif arg.startswith('--'):
+            option = arg.split('=', 1)[0]
+            if any([_.startswith(option) for _ in DAEMON_LOCAL_OPTION_LIST]): # argparse accepts abbreviations
+                return False
+        elif arg.startswith('-') and ('i' in arg or 'u' in arg):
+            return False # -i, -u, or combined short options like '-lu'
+
+    return True
+
+
+def run_daemon_client(argv):
+    """Run argv by the daemon if it is running.
+    Return: exit code, None if the daemon is not available
+    """
+
+    if 'TLDR_NO_DAEMON' in os.environ or is_trace_env_set() or not is_daemon_forwardable(argv):
+        return None
+
+    socket_path = get_daemon_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    import socket # not before, most runs have no daemon
+    import json
+
+    stdin_data = None
+    if '-b' in argv or '--batch' in argv:
+        if sys.stdin.isatty():
+            return None
+        stdin_data = sys.stdin.read()
+
+    request = {
+        'argv': argv,
+        'env': {name: os.environ[name] for name in DAEMON_FORWARD_ENV_LIST if name in os.environ},
+        'stdout_isatty': sys.stdout.isatty(),
+        'stderr_isatty': sys.stderr.isatty(),
+        'stdin': stdin_data,
+    }
+
+    log = logging.getLogger(__name__)
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(DAEMON_TIMEOUT)
+    try:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode('utf-8'))
+        client.shutdown(socket.SHUT_WR)
+    except OSError: # stale socket, or timeout
+        client.close()
+        return None
+
+    exit_code = None
+    received = False
+    with client, client.makefile('rb') as f:
+        output_map = {b'o': sys.stdout.buffer, b'e': sys.stderr.buffer}
+        last_output = None
+        while True:
+            try:
+                header = f.read(5)
+                if len(header) < 5:
+                    break
+
+                kind, size = header[:1], int.from_bytes(header[1:], 'big')
+                data = f.read(size)
+            except TimeoutError:
+                if not received: # nothing printed yet, safe to run in process
+                    log.debug('Daemon timed out')
+                    return None
+
+                log.error('Daemon timed out')
+                break
+
+            received = True
+            if kind == b'x':
+                exit_code = int(data)
+                break
+
+            output = output_map[kind]
+            if last_output is not None and last_output is not output:
+                last_output.flush() # keep stdout and stderr in order
+            output.write(data)
+            last_output = output
+
+    if not received:
+        return None
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    return 1 if exit_code is None else exit_code
+
+
+@trace_phase('write')
+def flush_stdout():
+    sys.stdout.flush()
 
 
 def _main():
     """Entry point wrapper"""
 
+    if is_trace_env_set() or '--profile' in sys.argv[1:]:
+        start_trace('json' if os.environ.get('TLDR_TRACE') == 'json' else 'text')
+
     # https://docs.python.org/3/library/signal.html#note-on-sigpipe
     try:
+        exit_code = run_daemon_client(sys.argv[1:])
+        if exit_code is not None:
+            sys.exit(exit_code)
+
         main()
-        sys.stdout.flush()
+        flush_stdout()
     except BrokenPipeError:
         devnull = os.open(os.devnull, os.O_WRONLY)
         os.dup2(devnull, sys.stdout.fileno())
         sys.exit(1)
+    finally:
+        if TRACER is not None:
+            TRACER.report(sys.argv[1:])
 
 
 if __name__ == "__main__":
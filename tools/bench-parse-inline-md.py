@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Benchmark parse_inline_md() over all lines of all tldr pages, against the original re.split() based implementation
+
+https://github.com/Phuker/multi-tldr
+"""
+
+import os
+import sys
+import re
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import tldr
+
+
+CONFIG = {
+    'repo_directory_list': [],
+    'color_output': 'always',
+    'colors': {
+        'description': 'bright_yellow',
+        'usage': 'green',
+        'command': 'white',
+        'param': 'cyan',
+    },
+    'command_indent_size': 4,
+    'platform_list': [],
+    'compact_output': False,
+}
+
+
+def parse_inline_md_reference(line, line_type):
+    """The original re.split() based parse_inline_md()"""
+
+    line_list = re.split(r'(`|\{\{|\}\})', line)
+    line_list = [_ for _ in line_list if len(_) > 0]
+    code_started = False
+    result = ''
+
+    result += tldr.get_escape_str_by_type(line_type)
+    type_stack = [None] * 8
+    type_stack.append(line_type)
+    for item in line_list:
+        if item == '`':
+            if not code_started:
+                result += tldr.get_escape_str_by_type('command')
+                type_stack.append('command')
+            else:
+                type_stack.pop()
+                result += tldr.get_escape_str_by_type(type_stack[-1])
+
+            code_started = not code_started
+        elif item == '{{':
+            result += tldr.get_escape_str_by_type('param')
+            type_stack.append('param')
+        elif item == '}}':
+            type_stack.pop()
+            result += tldr.get_escape_str_by_type(type_stack[-1])
+        else:
+            result += item
+
+    result += tldr.get_escape_str(reset=True)
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark parse_inline_md() over a tldr pages corpus',
+        add_help=True
+    )
+
+    parser.add_argument('tldr_dir', metavar='DIR', help='tldr pages dir path, e.g. the root of tldr-pages/tldr repo')
+    parser.add_argument('-n', '--repeat', type=int, default=5, help='Repeat times, the best is reported')
+    args = parser.parse_args()
+
+    return args
+
+
+def get_inline_list(tldr_dir):
+    """Get (line, line_type) in the same way as parse_page()"""
+
+    inline_list = []
+    for top, _, files in os.walk(tldr_dir):
+        for filename in files:
+            if not filename.endswith('.md'):
+                continue
+
+            with open(os.path.join(top, filename), 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip('\n')
+                    if line.startswith('# ') or line == '':
+                        continue
+                    elif line.startswith('> '):
+                        inline_list.append((line[2:], 'description'))
+                    elif line.startswith('- '):
+                        inline_list.append((line[2:], 'usage'))
+                    elif line.startswith('`'):
+                        inline_list.append((line.strip('`'), 'command'))
+                    else:
+                        inline_list.append((line, 'usage'))
+
+    return inline_list
+
+
+def bench(func, inline_list, repeat):
+    best = None
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        for line, line_type in inline_list:
+            try:
+                func(line, line_type)
+            except IndexError:
+                pass
+        time_used = time.perf_counter() - time_start
+        if best is None or time_used < best:
+            best = time_used
+
+    return best
+
+
+def main():
+    args = parse_args()
+
+    tldr.get_config = lambda: CONFIG
+    inline_list = get_inline_list(args.tldr_dir)
+    print(f'Lines: {len(inline_list)}')
+
+    for line, line_type in inline_list:
+        try:
+            result_expected = parse_inline_md_reference(line, line_type)
+        except IndexError:
+            continue
+        assert tldr.parse_inline_md(line, line_type) == result_expected, f'Output differs: {line!r}'
+
+    time_reference = bench(parse_inline_md_reference, inline_list, args.repeat)
+    time_current = bench(tldr.parse_inline_md, inline_list, args.repeat)
+    print(f'reference: {time_reference * 1000:.1f} ms')
+    print(f'current:   {time_current * 1000:.1f} ms')
+    print(f'speedup:   {time_reference / time_current:.2f}x')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+
+"""
+Benchmark suite over synthetic tldr pages corpora, compare against a stored baseline
+
+    tools/bench-suite.py --pages 50000 --save-baseline baseline.json
+    tools/bench-suite.py --pages 50000 --baseline baseline.json --threshold 0.2
+
+https://github.com/Phuker/multi-tldr
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+TLDR_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'tldr.py')
+sys.path.insert(0, os.path.dirname(TLDR_PATH))
+
+import tldr
+
+
+PLATFORM_LIST = ['common', 'linux', 'osx', 'windows', 'android', 'sunos', 'freebsd', 'netbsd', 'openbsd', 'cisco-ios']
+WORD_LIST = [
+    'file', 'directory', 'path', 'list', 'show', 'print', 'remove', 'create', 'update', 'archive', 'compress', 'extract',
+    'network', 'interface', 'process', 'user', 'group', 'permission', 'package', 'install', 'search', 'query', 'config',
+    'remote', 'branch', 'commit', 'image', 'container', 'service', 'log', 'output', 'input', 'format', 'size', 'disk',
+]
+CORPUS_VERSION = 1
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Benchmark index, lookup, parse and CLI startup over a synthetic tldr pages corpus',
+        add_help=True
+    )
+
+    parser.add_argument('--pages', type=int, default=10000, help='Pages in the first repo, other repos are translations of a part of them')
+    parser.add_argument('--platforms', type=int, default=5, help=f'Platforms, at most {len(PLATFORM_LIST)}')
+    parser.add_argument('--repos', type=int, default=2, help='Repos, like pages/, pages.xx/')
+    parser.add_argument('--inline-density', type=float, default=1.0, help='Relative density of inline `code` and {{param}} in pages')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed, the same arguments generate the same corpus')
+    parser.add_argument('--corpus-dir', metavar='DIR', help='Keep the corpus in DIR, reuse it if generated with the same arguments')
+    parser.add_argument('-n', '--repeat', type=int, default=7, help='Samples of each benchmark')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare against the baseline in FILE')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Fail if a median is slower than the baseline by this ratio')
+    parser.add_argument('--save-baseline', metavar='FILE', help='Save results as the baseline to FILE')
+    args = parser.parse_args()
+
+    assert 0 < args.platforms <= len(PLATFORM_LIST), 'Bad --platforms'
+    assert args.pages > 0 and args.repos > 0 and args.repeat > 0, 'Bad --pages, --repos or --repeat'
+
+    return args
+
+
+def get_inline_text(rng, density, word_count):
+    word_list = []
+    for _ in range(word_count):
+        word = rng.choice(WORD_LIST)
+        r = rng.random()
+        if r < 0.08 * density:
+            word = f'`{word}`'
+        elif r < 0.16 * density:
+            word = f'{{{{{word}}}}}'
+        word_list.append(word)
+
+    return ' '.join(word_list)
+
+
+def get_page(rng, command, density):
+    line_list = [f'# {command}', '', f'> {get_inline_text(rng, density, rng.randint(4, 12)).capitalize()}.', f'> More information: <https://example.com/{command}>.', '']
+    for _ in range(rng.randint(3, 8)):
+        line_list.append(f'- {get_inline_text(rng, density / 2, rng.randint(3, 10)).capitalize()}:')
+        line_list.append('')
+        param_list = [f'{{{{{rng.choice(WORD_LIST)}}}}}' if rng.random() < 0.5 * density else f'--{rng.choice(WORD_LIST)}' for _ in range(rng.randint(1, 4))]
+        line_list.append(f'`{command} {" ".join(param_list)}`')
+        line_list.append('')
+
+    return '\n'.join(line_list)
+
+
+def generate_corpus(corpus_dir, args):
+    """Return: repo_directory_list"""
+
+    params = {'version': CORPUS_VERSION, 'pages': args.pages, 'platforms': args.platforms, 'repos': args.repos, 'inline_density': args.inline_density, 'seed': args.seed}
+    params_path = os.path.join(corpus_dir, 'params.json')
+    repo_directory_list = [os.path.join(corpus_dir, 'pages' if i == 0 else f'pages.l{i}') for i in range(args.repos)]
+
+    if os.path.exists(params_path):
+        with open(params_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == params:
+                print(f'Reuse corpus: {corpus_dir}')
+                return repo_directory_list
+        shutil.rmtree(corpus_dir)
+
+    rng = random.Random(args.seed)
+    platform_list = PLATFORM_LIST[:args.platforms]
+    name_set = set()
+    while len(name_set) < args.pages:
+        name_set.add('-'.join(rng.sample(WORD_LIST, rng.choice((1, 2, 2, 3)))) + str(rng.randint(0, 99)))
+    entry_list = [(rng.choice(platform_list), name) for name in sorted(name_set)]
+
+    time_start = time.perf_counter()
+    for i, repo_directory in enumerate(repo_directory_list):
+        repo_entry_list = entry_list if i == 0 else rng.sample(entry_list, len(entry_list) // (2 * i))
+        for platform in platform_list:
+            os.makedirs(os.path.join(repo_directory, platform), exist_ok=True)
+        for platform, command in repo_entry_list:
+            with open(os.path.join(repo_directory, platform, command + '.md'), 'w', encoding='utf-8') as f:
+                f.write(get_page(rng, command, args.inline_density))
+
+    with open(params_path, 'w', encoding='utf-8') as f:
+        json.dump(params, f)
+
+    print(f'Generated corpus in {time.perf_counter() - time_start:.1f}s: {corpus_dir}')
+    return repo_directory_list
+
+
+def write_config(config_dir, repo_directory_list, platform_list):
+    config = {
+        'repo_directory_list': repo_directory_list,
+        'color_output': 'always',
+        'colors': {
+            'description': 'bright_yellow',
+            'usage': 'green',
+            'command': 'white',
+            'param': 'cyan',
+        },
+        'command_indent_size': 4,
+        'platform_list': platform_list,
+        'compact_output': False,
+    }
+    with open(os.path.join(config_dir, 'tldr.config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4)
+
+
+def reset(cold):
+    """Drop in-process caches, and the persistent caches if cold"""
+
+    tldr.clear_all_caches()
+    if cold:
+        shutil.rmtree(tldr.get_cache_dir_path(), ignore_errors=True)
+
+
+def sample(func, repeat, setup=None):
+    """Return: [seconds, ]"""
+
+    time_list = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        time_start = time.perf_counter()
+        func()
+        time_list.append(time.perf_counter() - time_start)
+
+    return time_list
+
+
+def get_stats(time_list, op_count=1):
+    time_list = sorted([_ / op_count for _ in time_list])
+    p95 = time_list[max(0, math.ceil(len(time_list) * 0.95) - 1)]
+    median = time_list[len(time_list) // 2] if len(time_list) % 2 else sum(time_list[len(time_list) // 2 - 1:len(time_list) // 2 + 1]) / 2
+
+    return {'median_ms': median * 1000, 'p95_ms': p95 * 1000}
+
+
+def run_benchmarks(args, repo_directory_list, env):
+    """Return: {name: {'median_ms': float, 'p95_ms': float}, }"""
+
+    rng = random.Random(args.seed)
+    result = {}
+
+    def bench(name, func, setup=None, op_count=1, repeat=args.repeat):
+        result[name] = get_stats(sample(func, repeat, setup), op_count)
+        print(f'{name:<32}{result[name]["median_ms"]:>12.3f}{result[name]["p95_ms"]:>12.3f}')
+
+    def get_index_all():
+        for repo_directory in repo_directory_list:
+            tldr.get_index(repo_directory)
+
+    print(f'{"benchmark":<32}{"median ms":>12}{"p95 ms":>12}')
+
+    bench('get_index.cold', get_index_all, setup=lambda: reset(cold=True))
+    bench('get_index.warm', get_index_all, setup=lambda: reset(cold=False))
+
+    reset(cold=False)
+    entry_list = [(platform, command) for platform, command in tldr.get_index(repo_directory_list[0])]
+    command_list = [command for _, command in rng.sample(entry_list, min(1000, len(entry_list)))]
+    page_path_list = [os.path.join(repo_directory_list[0], platform, command + '.md') for platform, command in rng.sample(entry_list, min(200, len(entry_list)))]
+
+    def lookup(platform):
+        def func():
+            for command in command_list:
+                tldr.get_page_path_list(command, platform)
+        return func
+
+    bench('get_page_path_list.default', lookup('default'), op_count=len(command_list))
+    bench('get_page_path_list.all.cold', lambda: tldr.get_page_path_list(command_list[0], 'all'), setup=lambda: reset(cold=False))
+    bench('get_page_path_list.all.warm', lookup('all'), op_count=len(command_list))
+    bench('get_page_path_list.list', lambda: tldr.get_page_path_list(None, 'all'))
+
+    def parse_pages():
+        for page_path in page_path_list:
+            tldr.parse_page(page_path)
+
+    bench('parse_page', parse_pages, op_count=len(page_path_list))
+
+    inline_list = []
+    for page_path in page_path_list:
+        with open(page_path, 'r', encoding='utf-8') as f:
+            inline_list += [(line[2:], 'usage') for line in f if line.startswith('- ')]
+
+    def parse_inline_md():
+        for line, line_type in inline_list:
+            tldr.parse_inline_md(line, line_type)
+
+    bench('parse_inline_md', parse_inline_md, op_count=len(inline_list))
+
+    def run_cli():
+        subprocess.run([sys.executable, TLDR_PATH, '-p', 'all', rng.choice(command_list)], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+
+    bench('cli.cold', run_cli, setup=lambda: reset(cold=True))
+    bench('cli.warm', run_cli, setup=run_cli)
+
+    return result
+
+
+def compare_baseline(result, baseline, threshold):
+    """Return: whether no benchmark is slower than the baseline beyond threshold"""
+
+    ok = True
+    print(f'\n{"benchmark":<32}{"baseline ms":>12}{"median ms":>12}{"ratio":>8}')
+    for name, stats in result.items():
+        if name not in baseline['results']:
+            continue
+
+        baseline_median = baseline['results'][name]['median_ms']
+        ratio = stats['median_ms'] / baseline_median if baseline_median > 0 else 1.0
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  REGRESSION'
+            ok = False
+        print(f'{name:<32}{baseline_median:>12.3f}{stats["median_ms"]:>12.3f}{ratio:>8.2f}{mark}')
+
+    return ok
+
+
+def main():
+    args = parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='tldr-bench-')
+    try:
+        corpus_dir = args.corpus_dir or os.path.join(temp_dir, 'corpus')
+        repo_directory_list = generate_corpus(os.path.abspath(corpus_dir), args)
+
+        config_dir = os.path.join(temp_dir, 'config')
+        os.makedirs(config_dir)
+        write_config(config_dir, repo_directory_list, PLATFORM_LIST[:min(3, args.platforms)])
+        os.environ['TLDR_CONFIG_DIR'] = config_dir
+        env = dict(os.environ, TLDR_NO_DAEMON='1')
+
+        print(f'Python {sys.version.split()[0]}, {args.pages} pages, {args.platforms} platforms, {args.repos} repos\n')
+        result = run_benchmarks(args, repo_directory_list, env)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    params = {'pages': args.pages, 'platforms': args.platforms, 'repos': args.repos, 'inline_density': args.inline_density, 'seed': args.seed}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'results': result}, f, indent=4)
+        print(f'\nSaved baseline: {args.save_baseline}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['params'] != params:
+            print(f'\nWarning: baseline is generated with other arguments: {baseline["params"]!r}')
+        if not compare_baseline(result, baseline, args.threshold):
+            print(f'\nFailed: slower than the baseline by more than {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()